@@ -0,0 +1,131 @@
+"""
+Equity-curve analytics over account_state rows, and signal pipeline
+latency breakdowns
+
+Series are computed with NumPy over the full range (so max drawdown and
+returns are exact), then downsampled with LTTB (largest-triangle-three-
+buckets) on the equity series. The same indices are used for every
+series so they stay aligned.
+"""
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points LTTB keeps; first and last point are always kept"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket edges for the n-2 interior points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def equity_series(rows: List[dict], points: int) -> dict:
+    """account_state rows (ordered by timestamp) -> downsampled series + full-range summary"""
+    if not rows:
+        return {"points": 0, "source_rows": 0, "summary": {}, "series": {}}
+
+    timestamps = np.asarray([r["timestamp"][:19] for r in rows], dtype="datetime64[s]")
+    t = timestamps.astype(np.int64).astype(np.float64)
+    equity = np.asarray([r["equity"] for r in rows], dtype=np.float64)
+    balance = np.asarray([r["balance"] for r in rows], dtype=np.float64)
+
+    peak = np.maximum.accumulate(equity)
+    drawdown = equity - peak
+    drawdown_pct = np.divide(drawdown, peak, out=np.zeros_like(drawdown), where=peak > 0)
+    cumulative_return = equity / equity[0] - 1 if equity[0] else np.zeros_like(equity)
+
+    idx = lttb_indices(t, equity, points)
+    # Period returns between consecutive kept points
+    kept = equity[idx]
+    returns = np.zeros_like(kept)
+    np.divide(np.diff(kept), kept[:-1], out=returns[1:], where=kept[:-1] != 0)
+
+    return {
+        "points": int(len(idx)),
+        "source_rows": int(len(rows)),
+        "summary": {
+            "start_equity": float(equity[0]),
+            "end_equity": float(equity[-1]),
+            "total_return": float(cumulative_return[-1]),
+            "max_drawdown": float(drawdown.min()),
+            "max_drawdown_pct": float(drawdown_pct.min()),
+            "peak_equity": float(peak[-1]),
+        },
+        "series": {
+            "timestamp": timestamps[idx].astype(str).tolist(),
+            "equity": np.round(equity[idx], 2).tolist(),
+            "balance": np.round(balance[idx], 2).tolist(),
+            "drawdown": np.round(drawdown[idx], 2).tolist(),
+            "drawdown_pct": np.round(drawdown_pct[idx], 6).tolist(),
+            "return": np.round(returns, 6).tolist(),
+            "cumulative_return": np.round(cumulative_return[idx], 6).tolist(),
+        },
+    }
+
+
+# Signal lifecycle timestamps in pipeline order (columns of the signals table)
+LATENCY_STAGES = ("generated_at", "received_at", "created_at", "claimed_at", "executed_at", "confirmed_at")
+STAGE_NAMES = {"created_at": "stored"}
+
+
+def _epoch(value) -> float:
+    """ISO timestamp -> epoch seconds; naive means UTC, offsets are applied, unparseable is NaN"""
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return np.nan
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _epoch_column(rows: List[dict], field: str) -> np.ndarray:
+    """Timestamps -> float seconds, NaN where missing or malformed"""
+    return np.asarray([_epoch(r[field]) if r.get(field) else np.nan for r in rows], dtype=np.float64)
+
+
+def stage_latency(rows: List[dict], percentiles=(50, 90, 99)) -> dict:
+    """Per-hop latency percentiles (ms) between consecutive lifecycle stages"""
+    if not rows:
+        return {}
+    columns = {stage: _epoch_column(rows, stage) for stage in LATENCY_STAGES}
+
+    hops = list(zip(LATENCY_STAGES, LATENCY_STAGES[1:])) + [("received_at", "confirmed_at")]
+    result = {}
+    for start, end in hops:
+        delta = (columns[end] - columns[start]) * 1000
+        delta = delta[~np.isnan(delta)]
+        name = f"{STAGE_NAMES.get(start, start[:-3])}->{STAGE_NAMES.get(end, end[:-3])}"
+        if len(delta) == 0:
+            result[name] = {"count": 0}
+            continue
+        values = np.percentile(delta, percentiles)
+        result[name] = {
+            "count": int(len(delta)),
+            "mean_ms": round(float(delta.mean()), 1),
+            **{f"p{p}_ms": round(float(v), 1) for p, v in zip(percentiles, values)},
+            "max_ms": round(float(delta.max()), 1),
+        }
+    return result
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Background archival of cold rows (hot/cold split)
+
+Rows older than each table's retention window are streamed out of the
+hot table in id-ordered chunks. Each chunk is written as one zstd-
+compressed NDJSON file and recorded in archive_index (table, id range,
+time range, row count, path). The chunk is then deleted from the hot
+table, so only one chunk is ever held in memory.
+
+Files go to a Supabase Storage bucket when ARCHIVE_BUCKET is set,
+otherwise to ARCHIVE_DIR on local disk.
+
+Run once from the command line with: python archiver.py [--dry-run]
+"""
+import argparse
+import io
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+import orjson
+import zstandard
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_BUCKET = os.getenv("ARCHIVE_BUCKET", "")
+ARCHIVE_CHUNK_ROWS = int(os.getenv("ARCHIVE_CHUNK_ROWS", "5000"))
+# Ids per DELETE request (keeps the in.(...) filter well under URL limits)
+DELETE_BATCH = 500
+PAGE_SIZE = 1000  # PostgREST default max rows per request
+
+
+@dataclass
+class ArchiveSpec:
+    table: str
+    time_column: str
+    retention_days: int
+    # Only rows in these statuses are cold (e.g. never archive pending signals)
+    statuses: Optional[Tuple[str, ...]] = None
+
+
+ARCHIVE_SPECS = [
+    ArchiveSpec("account_state", "timestamp", int(os.getenv("ARCHIVE_ACCOUNT_STATE_DAYS", "30"))),
+    ArchiveSpec("signals", "created_at", int(os.getenv("ARCHIVE_SIGNALS_DAYS", "90")),
+                statuses=("executed", "failed", "expired", "rejected")),
+    ArchiveSpec("trades", "closed_at", int(os.getenv("ARCHIVE_TRADES_DAYS", "180")), statuses=("closed",)),
+]
+
+
+def _cold_query(supabase, spec: ArchiveSpec, cutoff: str, after_id: int):
+    query = supabase.table(spec.table).select("*").lt(spec.time_column, cutoff).gt("id", after_id)
+    if spec.statuses:
+        query = query.in_("status", list(spec.statuses))
+    return query.order("id")
+
+
+def iter_cold_chunks(supabase, spec: ArchiveSpec, cutoff: str, chunk_rows: int) -> Iterator[List[dict]]:
+    """Yield id-ordered chunks of cold rows, paging PostgREST by keyset (id)"""
+    after_id = 0
+    chunk: List[dict] = []
+    while True:
+        page = _cold_query(supabase, spec, cutoff, after_id).limit(PAGE_SIZE).execute()
+        rows = page.data or []
+        chunk.extend(rows)
+        if rows:
+            after_id = rows[-1]["id"]
+        if len(chunk) >= chunk_rows or (chunk and len(rows) < PAGE_SIZE):
+            yield chunk
+            chunk = []
+        if len(rows) < PAGE_SIZE:
+            return
+
+
+def compress_rows(rows: List[dict]) -> bytes:
+    """Rows -> zstd-compressed NDJSON, streamed row by row"""
+    out = io.BytesIO()
+    with zstandard.ZstdCompressor(level=10).stream_writer(out, closefd=False) as writer:
+        for row in rows:
+            writer.write(orjson.dumps(row))
+            writer.write(b"\n")
+    return out.getvalue()
+
+
+def read_archive(data: bytes) -> Iterator[dict]:
+    """Inverse of compress_rows: stream rows back out of an archive file"""
+    reader = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)), encoding="utf-8")
+    for line in reader:
+        if line.strip():
+            yield orjson.loads(line)
+
+
+def store_file(supabase, path: str, data: bytes) -> str:
+    if ARCHIVE_BUCKET:
+        # Overwrite on retry: a run that failed after uploading reuses the same path
+        supabase.storage.from_(ARCHIVE_BUCKET).upload(path, data, {"content-type": "application/zstd", "x-upsert": "true"})
+        return f"storage://{ARCHIVE_BUCKET}/{path}"
+    full_path = os.path.join(ARCHIVE_DIR, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "wb") as f:
+        f.write(data)
+    return full_path
+
+
+def archive_table(supabase, spec: ArchiveSpec, now: datetime, dry_run: bool = False) -> dict:
+    cutoff = (now - timedelta(days=spec.retention_days)).isoformat()
+    summary = {"table": spec.table, "cutoff": cutoff, "chunks": 0, "rows": 0, "bytes": 0}
+
+    for chunk in iter_cold_chunks(supabase, spec, cutoff, ARCHIVE_CHUNK_ROWS):
+        min_id, max_id = chunk[0]["id"], chunk[-1]["id"]
+        times = [r[spec.time_column] for r in chunk if r.get(spec.time_column)]
+        data = compress_rows(chunk)
+
+        summary["chunks"] += 1
+        summary["rows"] += len(chunk)
+        summary["bytes"] += len(data)
+        if dry_run:
+            continue
+
+        path = f"{spec.table}/{min(times)[:10]}/{spec.table}_{min_id}_{max_id}.ndjson.zst"
+        location = store_file(supabase, path, data)
+
+        supabase.table("archive_index").insert({
+            "table_name": spec.table,
+            "min_id": min_id,
+            "max_id": max_id,
+            "range_start": min(times),
+            "range_end": max(times),
+            "row_count": len(chunk),
+            "bytes": len(data),
+            "location": location,
+            "created_at": now.isoformat(),
+        }).execute()
+
+        # Exactly the rows written to the file; a predicate could catch rows that changed since the read
+        ids = [r["id"] for r in chunk]
+        for i in range(0, len(ids), DELETE_BATCH):
+            supabase.table(spec.table).delete().in_("id", ids[i:i + DELETE_BATCH]).execute()
+
+    return summary
+
+
+def run_archiver(supabase, dry_run: bool = False) -> List[dict]:
+    """Archive every table in ARCHIVE_SPECS (blocking)"""
+    now = datetime.utcnow()
+    return [archive_table(supabase, spec, now, dry_run) for spec in ARCHIVE_SPECS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move cold rows into compressed archive files")
+    parser.add_argument("--dry-run", action="store_true", help="Count and compress, but write/delete nothing")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+    for summary in run_archiver(supabase, args.dry_run):
+        print(f"✅ {summary['table']}: {summary['rows']} rows in {summary['chunks']} chunks "
+              f"({summary['bytes']} bytes) older than {summary['cutoff']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Offline replay of stored signals against historical candles
+
+Loads signals (from Supabase or a JSON/CSV export of the signals table)
+and a candle file (CSV or Parquet with time, symbol, open, high, low,
+close columns; Parquet needs pyarrow), then simulates SL/TP fills for
+every signal at once with NumPy. Symbols are replayed in parallel in a
+process pool.
+
+Outputs a per-signal outcome file, an equity curve with running drawdown,
+and a summary.
+
+Usage:
+    python backtest.py --candles candles.csv --signals signals.json
+    python backtest.py --candles candles.parquet --from-supabase --since 2025-01-01
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+OUTCOME_NO_DATA = 0
+OUTCOME_TP = 1
+OUTCOME_SL = 2
+OUTCOME_EXPIRED = 3
+OUTCOME_NO_FILL = 4
+OUTCOME_NAMES = {OUTCOME_NO_DATA: "no_data", OUTCOME_TP: "tp", OUTCOME_SL: "sl", OUTCOME_EXPIRED: "expired",
+                 OUTCOME_NO_FILL: "no_fill"}
+
+# Signals per block when building the (signals x bars) hit matrices
+CHUNK_SIZE = 4096
+
+
+def to_epoch_seconds(values) -> np.ndarray:
+    """ISO strings, datetimes or epoch numbers -> int64 epoch seconds"""
+    values = list(values)
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    try:
+        return np.asarray(values, dtype=np.float64).astype(np.int64)
+    except (TypeError, ValueError):
+        # Drop timezone suffixes / fractions: stored timestamps are UTC
+        iso = [str(v).replace(" ", "T")[:19] for v in values]
+        return np.asarray(iso, dtype="datetime64[s]").astype(np.int64)
+
+
+# ---------------------------------------------------------------- loading
+
+def load_candles(path: str) -> Dict[str, dict]:
+    """Candle file -> {symbol: {"time", "high", "low", "close"} arrays sorted by time}"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=["time", "symbol", "high", "low", "close"]).to_pydict()
+        columns = {k: table[k] for k in ("time", "symbol", "high", "low", "close")}
+    else:
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        columns = {k: [r[k] for r in rows] for k in ("time", "symbol", "high", "low", "close")}
+
+    symbols = np.asarray(columns["symbol"])
+    times = to_epoch_seconds(columns["time"])
+    high = np.asarray(columns["high"], dtype=np.float64)
+    low = np.asarray(columns["low"], dtype=np.float64)
+    close = np.asarray(columns["close"], dtype=np.float64)
+
+    candles = {}
+    for symbol in np.unique(symbols):
+        mask = symbols == symbol
+        order = np.argsort(times[mask], kind="stable")
+        candles[str(symbol)] = {
+            "time": times[mask][order],
+            "high": high[mask][order],
+            "low": low[mask][order],
+            "close": close[mask][order],
+        }
+    return candles
+
+
+def load_signals_file(path: str) -> List[dict]:
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def load_signals_supabase(since: Optional[str], page_size: int = 1000) -> List[dict]:
+    from supabase import create_client
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+    rows: List[dict] = []
+    start = 0
+    while True:
+        query = (supabase.table("signals").select("id, symbol, action, volume, entry, sl, tp, timeframe, created_at")
+                 .neq("status", "canary").or_("trace_id.is.null,trace_id.not.like.canary-*"))
+        if since:
+            query = query.gte("created_at", since)
+        page = query.order("created_at").range(start, start + page_size - 1).execute()
+        rows.extend(page.data or [])
+        if not page.data or len(page.data) < page_size:
+            return rows
+        start += page_size
+
+
+def is_canary(row: dict) -> bool:
+    """Synthetic probe signal from verify_signal_flow (never traded)"""
+    return row.get("status") == "canary" or str(row.get("trace_id") or "").startswith("canary-")
+
+
+def _float_column(signals: List[dict], field: str) -> np.ndarray:
+    return np.asarray([s.get(field) if s.get(field) not in (None, "") else np.nan for s in signals], dtype=np.float64)
+
+
+def signals_by_symbol(signals: List[dict]) -> Dict[str, dict]:
+    """Signal rows -> {symbol: column arrays}"""
+    grouped: Dict[str, List[dict]] = {}
+    for s in signals:
+        grouped.setdefault(s["symbol"], []).append(s)
+
+    columns = {}
+    for symbol, rows in grouped.items():
+        columns[symbol] = {
+            "id": np.asarray([int(r["id"]) for r in rows], dtype=np.int64),
+            "time": to_epoch_seconds(r["created_at"] for r in rows),
+            "side": np.asarray([1 if str(r["action"]).upper() == "BUY" else -1 for r in rows], dtype=np.int8),
+            "volume": _float_column(rows, "volume"),
+            "entry": _float_column(rows, "entry"),
+            "sl": _float_column(rows, "sl"),
+            "tp": _float_column(rows, "tp"),
+        }
+    return columns
+
+
+# ---------------------------------------------------------------- engine
+
+def simulate(candles: dict, signals: dict, max_bars: int, contract_size: float) -> dict:
+    """
+    Vectorized SL/TP simulation for one symbol
+
+    The arrival bar is the bar whose open is the last one at or before the
+    signal time. Market signals fill at its close. Signals with an entry
+    price fill at that price on the first later bar (within max_bars)
+    whose range touches it, otherwise they are no_fill: the arrival bar's
+    range includes prices from before the signal. Signals before the
+    first bar or after the last one are no_data. Once filled, SL/TP are checked against the next max_bars
+    bars after the fill bar. If SL and TP are both touched inside the same
+    bar, SL is assumed (conservative).
+    """
+    t, high, low, close = candles["time"], candles["high"], candles["low"], candles["close"]
+    n_bars = len(t)
+    n = len(signals["id"])
+
+    outcome = np.full(n, OUTCOME_NO_DATA, dtype=np.int8)
+    exit_price = np.full(n, np.nan)
+    exit_time = np.zeros(n, dtype=np.int64)
+    entry = signals["entry"].copy()
+
+    start = np.searchsorted(t, signals["time"], side="right") - 1
+    # Past the last bar means more than one (median) bar width after its open
+    bar_width = np.median(np.diff(t)) if n_bars > 1 else np.inf
+    has_data = (start >= 0) & (signals["time"] < t[-1] + bar_width) if n_bars else np.zeros(n, dtype=bool)
+    # Market entries fill at the close of the arrival bar
+    market = np.isnan(entry) & has_data
+    entry[market] = close[start[market]]
+
+    side = signals["side"].astype(np.float64)
+    steps = np.arange(max_bars)
+    filled = has_data.copy()
+
+    for lo_i in range(0, n, CHUNK_SIZE):
+        sl_ = slice(lo_i, min(n, lo_i + CHUNK_SIZE))
+        rows = np.arange(sl_.stop - sl_.start)
+
+        # Fill bar: the arrival bar for market signals, else the first later bar touching entry
+        fill_bar = start[sl_].copy()
+        limit = ~market[sl_] & has_data[sl_]
+        if limit.any():
+            idx = start[sl_][limit, None] + 1 + steps[None, :]
+            in_range = idx < n_bars
+            idx = np.minimum(idx, n_bars - 1)
+            level = entry[sl_][limit, None]
+            touched = (low[idx] <= level) & (high[idx] >= level) & in_range
+            fill_bar[limit] = idx[np.arange(idx.shape[0]), np.argmax(touched, axis=1)]
+            chunk_filled = filled[sl_]
+            chunk_filled[limit] = touched.any(axis=1)
+            filled[sl_] = chunk_filled
+
+        # SL/TP are only checked on bars after the fill bar (its close/range is already spent)
+        idx = fill_bar[:, None] + 1 + steps[None, :]
+        in_range = idx < n_bars
+        idx = np.minimum(idx, n_bars - 1)
+
+        hi_w, lo_w = high[idx], low[idx]
+        s = side[sl_, None]
+        sl_level = signals["sl"][sl_, None]
+        tp_level = signals["tp"][sl_, None]
+
+        # BUY: SL below (low <= sl), TP above (high >= tp); SELL mirrored.
+        # NaN levels never compare true, so missing SL/TP just never hit.
+        sl_hit = np.where(s > 0, lo_w <= sl_level, hi_w >= sl_level) & in_range
+        tp_hit = np.where(s > 0, hi_w >= tp_level, lo_w <= tp_level) & in_range
+        any_hit = sl_hit | tp_hit
+
+        hit = any_hit.any(axis=1)
+        first = np.argmax(any_hit, axis=1)
+        is_sl = sl_hit[rows, first]
+        # Expiry exits at the close of the last bar held (the fill bar if none followed it)
+        held = in_range.sum(axis=1)
+        expiry_bar = np.where(held > 0, idx[rows, np.maximum(held - 1, 0)], np.minimum(fill_bar, n_bars - 1))
+
+        chunk_outcome = np.where(hit, np.where(is_sl, OUTCOME_SL, OUTCOME_TP), OUTCOME_EXPIRED)
+        chunk_exit = np.where(hit, np.where(is_sl, signals["sl"][sl_], signals["tp"][sl_]), close[expiry_bar])
+        last_bar = np.where(hit, idx[rows, first], expiry_bar)
+
+        outcome[sl_] = chunk_outcome
+        exit_price[sl_] = chunk_exit
+        exit_time[sl_] = t[last_bar]
+
+    no_fill = has_data & ~filled
+    outcome[no_fill] = OUTCOME_NO_FILL
+    outcome[~has_data] = OUTCOME_NO_DATA
+    exit_price[~filled] = np.nan
+    exit_time[~filled] = signals["time"][~filled]
+
+    volume = np.nan_to_num(signals["volume"], nan=0.01)
+    pnl = np.where(filled, (exit_price - entry) * side * volume * contract_size, 0.0)
+    risk = np.abs(entry - signals["sl"])
+    r_multiple = np.where(risk > 0, (exit_price - entry) * side / np.where(risk > 0, risk, 1), np.nan)
+
+    return {
+        "id": signals["id"],
+        "entry_time": signals["time"],
+        "side": signals["side"],
+        "entry": entry,
+        "exit_price": exit_price,
+        "exit_time": exit_time,
+        "outcome": outcome,
+        "pnl": pnl,
+        "r_multiple": r_multiple,
+    }
+
+
+def _simulate_job(args):
+    symbol, candles, signals, max_bars, contract_size = args
+    return symbol, simulate(candles, signals, max_bars, contract_size)
+
+
+def replay(candles: Dict[str, dict], signals: Dict[str, dict], max_bars: int = 500,
+           contract_size: float = 100000.0, workers: Optional[int] = None) -> Dict[str, dict]:
+    """Simulate every symbol, one process per symbol"""
+    jobs = [(sym, candles[sym], sigs, max_bars, contract_size) for sym, sigs in signals.items() if sym in candles]
+    missing = sorted(set(signals) - set(candles))
+    if missing:
+        print(f"⚠️ No candles for: {', '.join(missing)}")
+
+    if workers == 1 or len(jobs) <= 1:
+        return dict(map(_simulate_job, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_simulate_job, jobs))
+
+
+def equity_curve(results: Dict[str, dict], starting_balance: float) -> dict:
+    """Combine per-symbol results into an equity curve ordered by exit time"""
+    exit_time = np.concatenate([r["exit_time"] for r in results.values()]) if results else np.empty(0, np.int64)
+    pnl = np.concatenate([r["pnl"] for r in results.values()]) if results else np.empty(0)
+
+    order = np.argsort(exit_time, kind="stable")
+    equity = starting_balance + np.cumsum(pnl[order])
+    peak = np.maximum.accumulate(np.concatenate([[starting_balance], equity]))[1:]
+    drawdown = equity - peak
+    drawdown_pct = np.where(peak > 0, drawdown / peak, 0.0)
+    return {"time": exit_time[order], "equity": equity, "drawdown": drawdown, "drawdown_pct": drawdown_pct}
+
+
+# ---------------------------------------------------------------- output
+
+def write_outcomes(path: str, results: Dict[str, dict]):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["signal_id", "symbol", "action", "entry_time", "entry", "exit_time", "exit_price", "outcome", "pnl", "r_multiple"])
+        for symbol, r in results.items():
+            entry_iso = r["entry_time"].astype("datetime64[s]").astype(str)
+            exit_iso = r["exit_time"].astype("datetime64[s]").astype(str)
+            for i in range(len(r["id"])):
+                writer.writerow([
+                    int(r["id"][i]), symbol, "BUY" if r["side"][i] > 0 else "SELL",
+                    entry_iso[i], round(float(r["entry"][i]), 5), exit_iso[i],
+                    round(float(r["exit_price"][i]), 5), OUTCOME_NAMES[int(r["outcome"][i])],
+                    round(float(r["pnl"][i]), 2), round(float(r["r_multiple"][i]), 3),
+                ])
+
+
+def write_equity(path: str, curve: dict):
+    times = curve["time"].astype("datetime64[s]").astype(str)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "equity", "drawdown", "drawdown_pct"])
+        for i in range(len(times)):
+            writer.writerow([times[i], round(float(curve["equity"][i]), 2), round(float(curve["drawdown"][i]), 2),
+                             round(float(curve["drawdown_pct"][i]), 5)])
+
+
+def summarize(results: Dict[str, dict], curve: dict, starting_balance: float) -> dict:
+    outcomes = np.concatenate([r["outcome"] for r in results.values()]) if results else np.empty(0, np.int8)
+    closed = np.isin(outcomes, (OUTCOME_TP, OUTCOME_SL))
+    return {
+        "signals": int(len(outcomes)),
+        **{name: int((outcomes == code).sum()) for code, name in OUTCOME_NAMES.items()},
+        "win_rate": float((outcomes == OUTCOME_TP).sum() / closed.sum()) if closed.any() else None,
+        "net_profit": float(curve["equity"][-1] - starting_balance) if len(curve["equity"]) else 0.0,
+        "max_drawdown": float(curve["drawdown"].min()) if len(curve["drawdown"]) else 0.0,
+        "max_drawdown_pct": float(curve["drawdown_pct"].min()) if len(curve["drawdown_pct"]) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored signals against historical candles")
+    parser.add_argument("--candles", required=True, help="CSV or Parquet with time, symbol, open, high, low, close")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--signals", help="JSON or CSV export of the signals table")
+    source.add_argument("--from-supabase", action="store_true", help="Load signals from Supabase")
+    parser.add_argument("--since", help="Only signals created at/after this date (Supabase)")
+    parser.add_argument("--max-bars", type=int, default=500, help="Bars to hold a signal before expiring it")
+    parser.add_argument("--contract-size", type=float, default=100000.0)
+    parser.add_argument("--balance", type=float, default=10000.0, help="Starting balance")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--out", default="backtest", help="Output prefix")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    candles = load_candles(args.candles)
+    rows = load_signals_supabase(args.since) if args.from_supabase else load_signals_file(args.signals)
+    rows = [r for r in rows if not is_canary(r)]
+    signals = signals_by_symbol(rows)
+    loaded = time.perf_counter()
+
+    results = replay(candles, signals, args.max_bars, args.contract_size, args.workers)
+    curve = equity_curve(results, args.balance)
+    simulated = time.perf_counter()
+
+    write_outcomes(f"{args.out}_signals.csv", results)
+    write_equity(f"{args.out}_equity.csv", curve)
+
+    summary = summarize(results, curve, args.balance)
+    summary["load_seconds"] = round(loaded - started, 3)
+    summary["simulate_seconds"] = round(simulated - loaded, 3)
+    print(json.dumps(summary, indent=2))
+    print(f"✅ Wrote {args.out}_signals.csv and {args.out}_equity.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark
+Bytes on the wire and serialization CPU per endpoint for each encoding
+
+Usage: python bench_wire.py [--iterations 2000] [--gzip-level 5]
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import msgpack
+import orjson
+
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD", "AUDUSD", "USDCAD"]
+
+
+def sample_trades(count: int):
+    """Rows shaped like the trades table (/api/trades/history)"""
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        price = round(random.uniform(1.0, 2.0), 5)
+        rows.append({
+            "id": 100000 + i,
+            "ticket": 50000000 + i,
+            "signal_id": 9000 + i,
+            "symbol": random.choice(SYMBOLS),
+            "action": random.choice(["BUY", "SELL"]),
+            "volume": 0.01,
+            "open_price": price,
+            "close_price": round(price + random.uniform(-0.01, 0.01), 5),
+            "profit": round(random.uniform(-50, 50), 2),
+            "status": "closed",
+            "opened_at": (now - timedelta(minutes=i * 15)).isoformat(),
+            "closed_at": (now - timedelta(minutes=i * 15 - 5)).isoformat(),
+            "updated_at": now.isoformat(),
+        })
+    return rows
+
+
+def sample_signals(count: int):
+    """Rows shaped like the signals table (/api/signals/pending)"""
+    now = datetime.utcnow()
+    rows = []
+    for i in range(count):
+        entry = round(random.uniform(1.0, 2.0), 5)
+        rows.append({
+            "id": 9000 + i,
+            "symbol": random.choice(SYMBOLS),
+            "action": random.choice(["BUY", "SELL"]),
+            "volume": 0.01,
+            "entry": entry,
+            "sl": round(entry - 0.005, 5),
+            "tp": round(entry + 0.01, 5),
+            "confidence": 0.85,
+            "timeframe": "1h",
+            "limit_orders": False,
+            "status": "pending",
+            "reasoning": "Trend continuation after pullback to the 50 EMA with bullish divergence",
+            "created_at": (now - timedelta(seconds=i)).isoformat(),
+            "executed_at": None,
+            "updated_at": now.isoformat(),
+        })
+    return rows
+
+
+def sample_candles(count: int):
+    """Payload sent to SIGNAL_GENERATOR_URL/analyze"""
+    price = 1.1
+    candles = []
+    for _ in range(count):
+        price += random.gauss(0, 0.0005)
+        candles.append(round(price, 5))
+    return {"symbol": "EURUSD", "candles": candles, "timeframe": "1h"}
+
+
+ENCODERS = {
+    # What FastAPI's default JSONResponse does
+    "json": lambda p: json.dumps(p, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8"),
+    "orjson": orjson.dumps,
+    "msgpack": lambda p: msgpack.packb(p, use_bin_type=True),
+}
+
+
+def bench(payload, iterations: int, gzip_level: int):
+    results = []
+    for name, encode in ENCODERS.items():
+        start = time.process_time()
+        for _ in range(iterations):
+            body = encode(payload)
+        encode_us = (time.process_time() - start) / iterations * 1e6
+
+        start = time.process_time()
+        for _ in range(iterations):
+            compressed = gzip.compress(body, compresslevel=gzip_level)
+        gzip_us = (time.process_time() - start) / iterations * 1e6
+
+        results.append((name, len(body), len(compressed), encode_us, gzip_us))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wire formats per endpoint")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--gzip-level", type=int, default=5, help="Match GZIP_LEVEL in main.py")
+    args = parser.parse_args()
+
+    random.seed(42)
+    endpoints = {
+        "/api/trades/history (limit=50)": sample_trades(50),
+        "/api/trades/history (limit=500)": sample_trades(500),
+        "/api/signals/pending (10)": sample_signals(10),
+        "generator /analyze (500 candles)": sample_candles(500),
+    }
+
+    print(f"{'endpoint':<34} {'format':<8} {'bytes':>8} {'gzip':>8} {'ratio':>6} {'encode µs':>10} {'gzip µs':>9}")
+    print("-" * 90)
+    for endpoint, payload in endpoints.items():
+        baseline = None
+        for name, raw, compressed, encode_us, gzip_us in bench(payload, args.iterations, args.gzip_level):
+            baseline = baseline or raw
+            print(f"{endpoint:<34} {name:<8} {raw:>8} {compressed:>8} {compressed / baseline:>6.2f} {encode_us:>10.1f} {gzip_us:>9.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
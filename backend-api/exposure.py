@@ -0,0 +1,256 @@
+"""
+In-memory exposure book and pre-trade risk check for incoming signals
+
+Net lots are kept per symbol in two arrays: open (confirmed trades, by
+ticket) and reserved (signals queued for the EA but not yet filled).
+Lots per currency are kept in a third array. Buying EURUSD is +lots EUR
+and -lots USD, so currency exposure is in lots, not notional. Symbols
+that don't start with two 3-letter codes (US30, ...) only count per
+symbol.
+
+The book is updated from trade confirmations, acks and position
+snapshots. An incoming signal is checked against the symbol, currency
+and gross caps using only these arrays, never a query. It is accepted,
+scaled down to the largest volume that fits, or rejected.
+
+State lives in one process; the API runs as a single worker.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CURRENCY_PAIR = re.compile(r"^([A-Z]{3})([A-Z]{3})")
+
+
+@dataclass
+class RiskDecision:
+    action: str  # accept, scale or reject
+    volume: float
+    reason: Optional[str] = None
+
+
+def signed_lots(action: str, volume: float) -> float:
+    """BUY -> +volume, SELL -> -volume"""
+    return volume if action.upper() == "BUY" else -volume
+
+
+def _fraction(current: float, delta: float, cap: float) -> float:
+    """Largest t in [0, 1] with |current + t*delta| <= cap; moves that shrink |current| always pass"""
+    target = current + delta
+    if abs(target) <= cap or abs(target) <= abs(current):
+        return 1.0
+    bound = cap if delta > 0 else -cap
+    return min(1.0, max(0.0, (bound - current) / delta))
+
+
+class ExposureBook:
+    def __init__(self, max_symbol_lots: float, max_currency_lots: float, max_gross_lots: float,
+                 symbol_caps: Optional[Dict[str, float]] = None, mode: str = "scale",
+                 min_lots: float = 0.01, lot_step: float = 0.01, capacity: int = 32):
+        self.max_symbol_lots = max_symbol_lots
+        self.max_currency_lots = max_currency_lots
+        self.max_gross_lots = max_gross_lots
+        self.symbol_caps = symbol_caps or {}
+        self.mode = mode
+        self.min_lots = min_lots
+        self.lot_step = lot_step
+
+        self.symbols: Dict[str, int] = {}
+        self.currencies: Dict[str, int] = {}
+        self.currency_codes: List[str] = []
+        self.open_lots = np.zeros(capacity)
+        self.reserved_lots = np.zeros(capacity)
+        self.symbol_cap = np.zeros(capacity)
+        self.base = np.full(capacity, -1, dtype=np.int64)
+        self.quote = np.full(capacity, -1, dtype=np.int64)
+        self.currency_lots = np.zeros(capacity)
+
+        self.tickets: Dict[int, Tuple[int, float]] = {}  # ticket -> (slot, signed lots)
+        self.reservations: Dict[int, Tuple[int, float]] = {}  # signal id -> (slot, signed lots)
+        self.counters = {"accept": 0, "scale": 0, "reject": 0}
+
+    def _currency(self, code: str) -> int:
+        idx = self.currencies.get(code)
+        if idx is None:
+            idx = len(self.currencies)
+            if idx == len(self.currency_lots):
+                self.currency_lots = np.concatenate([self.currency_lots, np.zeros(idx)])
+            self.currencies[code] = idx
+            self.currency_codes.append(code)
+        return idx
+
+    def _slot(self, symbol: str) -> int:
+        slot = self.symbols.get(symbol)
+        if slot is not None:
+            return slot
+        slot = len(self.symbols)
+        if slot == len(self.open_lots):
+            self.open_lots = np.concatenate([self.open_lots, np.zeros(slot)])
+            self.reserved_lots = np.concatenate([self.reserved_lots, np.zeros(slot)])
+            self.symbol_cap = np.concatenate([self.symbol_cap, np.zeros(slot)])
+            self.base = np.concatenate([self.base, np.full(slot, -1, dtype=np.int64)])
+            self.quote = np.concatenate([self.quote, np.full(slot, -1, dtype=np.int64)])
+        self.symbols[symbol] = slot
+        self.symbol_cap[slot] = self.symbol_caps.get(symbol, self.max_symbol_lots)
+        pair = CURRENCY_PAIR.match(symbol.upper())
+        if pair:
+            self.base[slot] = self._currency(pair.group(1))
+            self.quote[slot] = self._currency(pair.group(2))
+        return slot
+
+    def _shift_currencies(self, slot: int, lots: float):
+        if self.base[slot] >= 0:
+            self.currency_lots[self.base[slot]] += lots
+            self.currency_lots[self.quote[slot]] -= lots
+
+    def check(self, symbol: str, action: str, volume: float) -> RiskDecision:
+        """Accept, scale or reject a new signal against current exposure plus reservations"""
+        if self.mode == "off" or volume <= 0:
+            return RiskDecision("accept", volume)
+
+        slot = self._slot(symbol)
+        lots = signed_lots(action, volume)
+        n = len(self.symbols)
+        net = self.open_lots[:n] + self.reserved_lots[:n]
+
+        # (fraction of the volume that fits, binding cap name, cap)
+        limits = [(_fraction(net[slot], lots, self.symbol_cap[slot]), symbol, self.symbol_cap[slot])]
+        if self.base[slot] >= 0:
+            for idx, delta in ((self.base[slot], lots), (self.quote[slot], -lots)):
+                limits.append((_fraction(self.currency_lots[idx], delta, self.max_currency_lots),
+                               self.currency_codes[idx], self.max_currency_lots))
+        if abs(net[slot] + lots) > abs(net[slot]):
+            gross = float(np.abs(net).sum())
+            limits.append((min(1.0, max(0.0, (self.max_gross_lots - gross) / volume)), "gross", self.max_gross_lots))
+
+        fraction, name, cap = min(limits, key=lambda limit: limit[0])
+        if fraction >= 1.0:
+            self.counters["accept"] += 1
+            return RiskDecision("accept", volume)
+
+        reason = f"{name} cap {cap:g} lots"
+        allowed = math.floor(volume * fraction / self.lot_step + 1e-9) * self.lot_step
+        if self.mode == "scale" and allowed >= self.min_lots:
+            self.counters["scale"] += 1
+            return RiskDecision("scale", round(allowed, 8), f"scaled from {volume:g} lots by {reason}")
+        self.counters["reject"] += 1
+        return RiskDecision("reject", 0.0, f"exceeds {reason}")
+
+    def reserve(self, signal_id: int, symbol: str, action: str, volume: float):
+        """Count a queued signal until it is filled or released"""
+        if signal_id in self.reservations:
+            return
+        slot = self._slot(symbol)
+        lots = signed_lots(action, volume)
+        self.reservations[signal_id] = (slot, lots)
+        self.reserved_lots[slot] += lots
+        self._shift_currencies(slot, lots)
+
+    def release(self, signal_id: int):
+        entry = self.reservations.pop(signal_id, None)
+        if entry:
+            slot, lots = entry
+            self.reserved_lots[slot] -= lots
+            self._shift_currencies(slot, -lots)
+
+    def open(self, ticket: int, symbol: str, action: str, volume: float, signal_id: Optional[int] = None):
+        """A trade was confirmed: its signal's reservation becomes an open position"""
+        if signal_id is not None:
+            self.release(signal_id)
+        if ticket in self.tickets:
+            return
+        slot = self._slot(symbol)
+        lots = signed_lots(action, volume)
+        self.tickets[ticket] = (slot, lots)
+        self.open_lots[slot] += lots
+        self._shift_currencies(slot, lots)
+
+    def fill(self, signal_id: int, ticket: Optional[int]):
+        """Signal acked as executed: reuse the reservation's symbol and lots for the position"""
+        entry = self.reservations.pop(signal_id, None)
+        if entry is None:
+            return
+        slot, lots = entry
+        self.reserved_lots[slot] -= lots
+        if ticket is None or ticket in self.tickets:
+            self._shift_currencies(slot, -lots)
+            return
+        self.tickets[ticket] = (slot, lots)
+        self.open_lots[slot] += lots
+
+    def sync(self, positions: List[dict]):
+        """Replace open exposure with a full snapshot of open positions (ticket, symbol, action, volume)"""
+        self.tickets = {}
+        for p in positions:
+            self.tickets[p["ticket"]] = (self._slot(p["symbol"]), signed_lots(p["action"], p["volume"]))
+        self._rebuild()
+
+    def _rebuild(self):
+        """Recompute the arrays from the ticket and reservation maps"""
+        n = len(self.symbols)
+        self.open_lots[:] = 0
+        self.reserved_lots[:] = 0
+        for source, target in ((self.tickets, self.open_lots), (self.reservations, self.reserved_lots)):
+            if source:
+                slots, lots = zip(*source.values())
+                np.add.at(target, np.asarray(slots), np.asarray(lots))
+
+        net = self.open_lots[:n] + self.reserved_lots[:n]
+        self.currency_lots[:] = 0
+        paired = self.base[:n] >= 0
+        np.add.at(self.currency_lots, self.base[:n][paired], net[paired])
+        np.add.at(self.currency_lots, self.quote[:n][paired], -net[paired])
+
+    def load(self, open_trades: List[dict], queued_signals: List[dict]):
+        """Seed from the database on startup"""
+        self.tickets = {t["ticket"]: (self._slot(t["symbol"]), signed_lots(t["action"], t["volume"]))
+                        for t in open_trades if t.get("ticket") is not None}
+        self.reservations = {s["id"]: (self._slot(s["symbol"]), signed_lots(s["action"], s["volume"]))
+                             for s in queued_signals}
+        self._rebuild()
+
+    def status(self) -> dict:
+        n = len(self.symbols)
+        net = self.open_lots[:n] + self.reserved_lots[:n]
+        return {
+            "mode": self.mode,
+            "gross_lots": round(float(np.abs(net).sum()), 4),
+            "max_gross_lots": self.max_gross_lots,
+            "symbols": {
+                symbol: {
+                    "open": round(float(self.open_lots[slot]), 4),
+                    "reserved": round(float(self.reserved_lots[slot]), 4),
+                    "cap": float(self.symbol_cap[slot]),
+                }
+                for symbol, slot in self.symbols.items()
+            },
+            "currencies": {code: round(float(self.currency_lots[idx]), 4) for code, idx in self.currencies.items()},
+            "max_currency_lots": self.max_currency_lots,
+            "open_tickets": len(self.tickets),
+            "reservations": len(self.reservations),
+            "decisions": dict(self.counters),
+        }
+
+
+def _symbol_caps_from_env() -> Dict[str, float]:
+    """EXPOSURE_SYMBOL_CAPS=XAUUSD:1,EURUSD:3"""
+    caps = {}
+    for item in filter(None, os.getenv("EXPOSURE_SYMBOL_CAPS", "").split(",")):
+        symbol, cap = item.split(":")
+        caps[symbol.strip()] = float(cap)
+    return caps
+
+
+def exposure_book_from_env() -> ExposureBook:
+    return ExposureBook(
+        max_symbol_lots=float(os.getenv("EXPOSURE_MAX_SYMBOL_LOTS", "5")),
+        max_currency_lots=float(os.getenv("EXPOSURE_MAX_CURRENCY_LOTS", "10")),
+        max_gross_lots=float(os.getenv("EXPOSURE_MAX_GROSS_LOTS", "20")),
+        symbol_caps=_symbol_caps_from_env(),
+        mode=os.getenv("EXPOSURE_MODE", "scale"),
+        min_lots=float(os.getenv("EXPOSURE_MIN_LOTS", "0.01")),
+    )
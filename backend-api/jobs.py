@@ -0,0 +1,149 @@
+"""
+In-process background jobs: deferred side effects and housekeeping
+
+Each job is a named coroutine function. It can be periodic (every
+interval seconds), triggered (trigger(name, **kwargs) from a request
+handler, which returns immediately), or both.
+
+- Coalescing: one job never runs twice at once. Triggers that arrive
+  while a run is queued or in progress collapse into a single follow-up
+  run, called with the latest kwargs.
+- Bounded concurrency: at most max_concurrency jobs run at a time.
+  Latency-sensitive jobs can be registered dedicated=True: they skip
+  that shared limit (coalescing already caps each at one run), so slow
+  housekeeping never delays them.
+- Drain: drain() stops the schedules and refuses new triggers. It waits
+  up to a timeout for queued and running jobs, then cancels the rest.
+- Metrics: runs, failures, coalesced triggers, last error and run-time
+  percentiles per job.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from resilience import LatencyTracker
+
+
+class Job:
+    def __init__(self, name: str, fn: Callable[..., Awaitable[Any]], interval: Optional[float],
+                 initial_delay: float, timeout: Optional[float], dedicated: bool):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.timeout = timeout
+        self.dedicated = dedicated
+
+        self.task: Optional[asyncio.Task] = None  # drives queued runs; None when idle
+        self.pending = False
+        self.kwargs: Dict[str, Any] = {}
+        self.running = False
+
+        self.durations = LatencyTracker(window=100, min_samples=1)
+        self.counters = {"runs": 0, "failures": 0, "triggers": 0, "coalesced": 0}
+        self.last_started: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+
+class JobRunner:
+    def __init__(self, max_concurrency: int = 2):
+        self.jobs: Dict[str, Job] = {}
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.accepting = True
+        self._schedules = []
+
+    def register(self, name: str, fn: Callable[..., Awaitable[Any]], interval: Optional[float] = None,
+                 initial_delay: float = 0.0, timeout: Optional[float] = None, dedicated: bool = False):
+        """interval=None registers a triggered-only job; dedicated=True runs outside the shared limit"""
+        self.jobs[name] = Job(name, fn, interval, initial_delay, timeout, dedicated)
+
+    def trigger(self, name: str, **kwargs) -> bool:
+        """Queue a run (non-blocking); False if it was coalesced into an already queued one"""
+        job = self.jobs[name]
+        if not self.accepting:
+            return False
+        job.counters["triggers"] += 1
+        job.kwargs = kwargs
+        if job.pending:
+            job.counters["coalesced"] += 1
+            return False
+        job.pending = True
+        if job.task is None:
+            job.task = asyncio.create_task(self._drive(job))
+        return True
+
+    async def _drive(self, job: Job):
+        try:
+            while job.pending:
+                if job.dedicated:
+                    job.pending = False
+                    await self._run(job, job.kwargs)
+                    continue
+                async with self.semaphore:
+                    job.pending = False
+                    await self._run(job, job.kwargs)
+        finally:
+            job.task = None
+
+    async def _run(self, job: Job, kwargs: Dict[str, Any]):
+        job.running = True
+        job.last_started = datetime.utcnow().isoformat()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(job.fn(**kwargs), job.timeout)
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.counters["failures"] += 1
+            job.last_error = "timeout" if isinstance(e, asyncio.TimeoutError) else str(e)
+            print(f"❌ Job {job.name} failed: {job.last_error}")
+        finally:
+            job.running = False
+            job.counters["runs"] += 1
+            job.durations.record(time.perf_counter() - started)
+
+    async def _schedule(self, job: Job):
+        await asyncio.sleep(job.initial_delay)
+        while True:
+            self.trigger(job.name)
+            await asyncio.sleep(job.interval)
+
+    def start(self):
+        for job in self.jobs.values():
+            if job.interval:
+                self._schedules.append(asyncio.create_task(self._schedule(job)))
+
+    async def drain(self, timeout: float = 10.0):
+        """Stop schedules and triggers, let queued/running jobs finish, cancel stragglers"""
+        self.accepting = False
+        for schedule in self._schedules:
+            schedule.cancel()
+        active = [job.task for job in self.jobs.values() if job.task is not None]
+        if not active:
+            return
+        done, still_running = await asyncio.wait(active, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        print(f"✅ Jobs drained: {len(done)} finished, {len(still_running)} cancelled")
+
+    def status(self) -> dict:
+        jobs = {}
+        for name, job in self.jobs.items():
+            ms = lambda p: round(job.durations.percentile(p) * 1000, 1) if job.durations.samples else None
+            jobs[name] = {
+                "interval": job.interval,
+                "dedicated": job.dedicated,
+                "running": job.running,
+                "pending": job.pending,
+                **job.counters,
+                "last_started": job.last_started,
+                "last_error": job.last_error,
+                "last_ms": round(job.durations.samples[-1] * 1000, 1) if job.durations.samples else None,
+                "p50_ms": ms(50),
+                "p95_ms": ms(95),
+                "max_ms": ms(100),
+            }
+        return {"accepting": self.accepting, "max_concurrency": self.max_concurrency, "jobs": jobs}
@@ -1,17 +1,45 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import math
 import os
 from decimal import Decimal
 import httpx
 import asyncio
+import gzip
+import time
+import uuid
 from dotenv import load_dotenv
 
+from wire import WireRoute, negotiate, encode_json, is_msgpack, compact_response
+from resilience import ResilientCaller, CircuitOpenError, CoalescingCache
+from ratelimit import RateLimitMiddleware, limiter_from_env
+from reconcile import reconcile_positions, TRADE_COLUMNS
+from analytics import equity_series, stage_latency, LATENCY_STAGES
+from reports import compute_user_reports
+from archiver import run_archiver
+from exposure import exposure_book_from_env
+from symbols import SymbolTable, SPEC_FIELDS
+from jobs import JobRunner
+
 load_dotenv()
 
-app = FastAPI(title="MT5 Community Trading API")
+app = FastAPI(title="MT5 Community Trading API", default_response_class=ORJSONResponse)
+# Accept msgpack request bodies on every route (must be set before routes are declared)
+app.router.route_class = WireRoute
+
+# Per-key rate limiting with priority load shedding (innermost, so CORS
+# headers are still added to 429 responses)
+API_SECRET_KEY = os.getenv("API_SECRET_KEY", "Mr.creative090")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))  # 0 = ignore X-Forwarded-For (API reached directly)
+rate_limiter = limiter_from_env()
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, api_key=API_SECRET_KEY, proxy_hops=TRUSTED_PROXY_HOPS)
 
 # CORS - Read from environment for security
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -24,6 +52,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses for clients that send Accept-Encoding: gzip
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "500"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))  # 9 costs ~2x the CPU for ~5% fewer bytes
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
 # ✅ FIXED: Single verify_api_key function
 async def verify_api_key(request: Request, x_api_key: str = Header(None)):
     # Allow preflight through
@@ -36,7 +69,6 @@ async def verify_api_key(request: Request, x_api_key: str = Header(None)):
 # Supabase Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-API_SECRET_KEY = os.getenv("API_SECRET_KEY", "Mr.creative090")
 
 # Account Configuration
 ACCOUNT_MODE = os.getenv("ACCOUNT_MODE", "demo")  # "demo" or "real"
@@ -55,6 +87,70 @@ print(f"   CORS Origins: {ALLOWED_ORIGINS}")
 # Signal Generator Integration
 SIGNAL_GENERATOR_URL = os.getenv("SIGNAL_GENERATOR_URL", "https://anso-vision-backend.onrender.com")
 TRADING_BACKEND_URL = os.getenv("TRADING_BACKEND_URL", "http://localhost:8000")
+GENERATOR_WIRE_FORMAT = os.getenv("GENERATOR_WIRE_FORMAT", "json")  # "json" or "msgpack"
+GENERATOR_GZIP = os.getenv("GENERATOR_GZIP", "false").lower() == "true"
+
+# Latency analytics: cap rows scanned per request so query time stays bounded
+EQUITY_MAX_ROWS = int(os.getenv("EQUITY_MAX_ROWS", "100000"))
+EQUITY_BUCKETS_PER_POINT = 2  # SQL buckets per requested chart point (LTTB picks from up to 4 rows each)
+
+# Per-user performance reports (precomputed in the background)
+USER_REPORT_INTERVAL = int(os.getenv("USER_REPORT_INTERVAL", "900"))  # seconds
+USER_REPORT_DAYS = int(os.getenv("USER_REPORT_DAYS", "30"))
+user_reports = {}  # user_id -> latest report
+
+# Cold-data archival (off by default: ARCHIVE_DIR on Render is ephemeral, set ARCHIVE_BUCKET)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "21600"))  # seconds
+
+# Signal delivery: claimed signals must be acked within the lease or they go back to pending
+SIGNAL_LEASE_SECONDS = int(os.getenv("SIGNAL_LEASE_SECONDS", "120"))
+SIGNAL_MAX_DELIVERIES = int(os.getenv("SIGNAL_MAX_DELIVERIES", "3"))  # then marked failed
+SIGNAL_LEASE_SWEEP_INTERVAL = int(os.getenv("SIGNAL_LEASE_SWEEP_INTERVAL", "30"))  # seconds
+ACK_STATUSES = ("executed", "failed", "rejected")
+
+# Background jobs: side effects deferred off the request path, plus housekeeping
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "20"))  # seconds, on shutdown
+SIGNAL_PENDING_TTL = int(os.getenv("SIGNAL_PENDING_TTL", "3600"))  # pending this long -> expired
+SIGNAL_EXPIRY_INTERVAL = int(os.getenv("SIGNAL_EXPIRY_INTERVAL", "300"))  # seconds
+ACCOUNT_STATE_PRUNE_DAYS = int(os.getenv("ACCOUNT_STATE_PRUNE_DAYS", "0"))  # 0 = keep (the archiver handles retention)
+job_runner = JobRunner(max_concurrency=JOB_CONCURRENCY)
+
+# Pre-trade risk: net lots per symbol/currency, kept in memory and checked on every incoming signal
+exposure_book = exposure_book_from_env()
+
+# Symbol specs pushed by the EA: signals are normalized/validated against them at ingestion
+SYMBOL_SPECS_REQUIRED = os.getenv("SYMBOL_SPECS_REQUIRED", "false").lower() == "true"  # reject unknown symbols
+symbol_table = SymbolTable()
+
+# Dashboard: sections fetched concurrently, identical requests within the TTL share one result
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "2"))  # seconds
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv("DASHBOARD_SECTION_TIMEOUT", "5"))  # seconds
+dashboard_cache = CoalescingCache(DASHBOARD_CACHE_TTL)
+
+# Generator resilience: per-attempt timeout and overall deadline, retries, breaker, fallback cache
+generator_caller = ResilientCaller(
+    "signal-generator",
+    timeout=float(os.getenv("GENERATOR_TIMEOUT", "10")),
+    max_attempts=int(os.getenv("GENERATOR_MAX_ATTEMPTS", "3")),
+    failure_threshold=int(os.getenv("GENERATOR_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("GENERATOR_BREAKER_RESET", "30")),
+    hedge_percentile=float(os.getenv("GENERATOR_HEDGE_PERCENTILE", "95")),
+    cache_ttl=float(os.getenv("GENERATOR_CACHE_TTL", "60")),
+    deadline=float(os.getenv("GENERATOR_DEADLINE", "15")),
+)
+generator_http = None
+
+def get_generator_http():
+    """Shared HTTP client so generator calls reuse connections"""
+    global generator_http
+    if generator_http is None:
+        generator_http = httpx.AsyncClient(timeout=generator_caller.timeout)
+    return generator_http
+
+class GeneratorError(Exception):
+    """Generator answered with a retryable error status"""
 
 # Initialize Supabase client
 supabase_client = None
@@ -79,6 +175,9 @@ class Signal(BaseModel):
     timeframe: Optional[str] = None
     limit_orders: Optional[bool] = False  # ✅ NEW: Support limit orders
     reasoning: Optional[str] = None  # ✅ NEW: Signal reasoning
+    trace_id: Optional[str] = None  # Propagated to pending payload and trade confirmation
+    generated_at: Optional[datetime] = None  # When the generator produced the signal (ISO, any offset)
+    canary: bool = False  # Synthetic probe signal: stored, never handed to the EA
 
 class AccountUpdate(BaseModel):
     balance: float
@@ -93,6 +192,9 @@ class TradeConfirmation(BaseModel):
     symbol: str
     volume: float
     price: float
+    signal_id: Optional[int] = None
+    trace_id: Optional[str] = None
+    executed_at: Optional[str] = None  # EA execution time (UTC)
 
 class UserInvestment(BaseModel):
     user_id: str
@@ -103,30 +205,103 @@ class User(BaseModel):
     email: str
     investment: float = 0.0
 
+class OpenPosition(BaseModel):
+    ticket: int
+    symbol: str
+    action: str
+    volume: float
+    price: float
+    profit: Optional[float] = None
+    opened_at: Optional[str] = None
+
+class ClosedDeal(BaseModel):
+    ticket: int  # position ticket the deal closed
+    close_price: float
+    profit: float
+    volume: Optional[float] = None  # closed lots, weights the close price across partial closes
+    closed_at: Optional[str] = None  # UTC
+
+class PositionSnapshot(BaseModel):
+    positions: List[OpenPosition] = []
+    deals: List[ClosedDeal] = []
+
+class SymbolSpec(BaseModel):
+    symbol: str
+    digits: int
+    point: float
+    tick_size: float
+    volume_min: float
+    volume_max: float
+    volume_step: float
+    stops_level: int = 0  # minimum SL/TP distance in points
+
+class SymbolSpecBatch(BaseModel):
+    specs: List[SymbolSpec]
+
+class SignalAck(BaseModel):
+    signal_id: int
+    status: str  # executed, failed or rejected
+    ticket: Optional[int] = None
+    error: Optional[str] = None
+    executed_at: Optional[str] = None  # EA execution time (UTC)
+
+class SignalAckBatch(BaseModel):
+    acks: List[SignalAck]
+
 # Signal Generator Integration Functions
+def encode_generator_payload(payload: dict):
+    """Serialize a candle payload for the generator in the configured wire format"""
+    if GENERATOR_WIRE_FORMAT == "msgpack":
+        import msgpack
+        body = msgpack.packb(payload, use_bin_type=True)
+        headers = {"Content-Type": "application/x-msgpack", "Accept": "application/x-msgpack, application/json"}
+    else:
+        body = encode_json(payload)
+        headers = {"Content-Type": "application/json"}
+    
+    if GENERATOR_GZIP:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    
+    return body, headers
+
+def decode_generator_response(response: httpx.Response):
+    """Decode a generator response in whichever format it came back in"""
+    if is_msgpack(response.headers.get("content-type")):
+        import msgpack
+        return msgpack.unpackb(response.content, raw=False)
+    return response.json()
+
 async def fetch_signal_from_generator(symbol: str, candles: List[float], timeframe: str = "1h"):
     """Fetch trading signal from Anso Vision backend"""
+    payload = {
+        "symbol": symbol,
+        "candles": candles,
+        "timeframe": timeframe
+    }
+    body, headers = encode_generator_payload(payload)
+    
+    async def analyze():
+        response = await get_generator_http().post(
+            f"{SIGNAL_GENERATOR_URL}/analyze",
+            content=body,
+            headers=headers
+        )
+        if response.status_code == 429 or response.status_code >= 500:
+            raise GeneratorError(f"HTTP {response.status_code}: {response.text[:200]}")
+        if response.status_code != 200:
+            print(f"❌ Signal generator error: {response.text}")
+            return None
+        return decode_generator_response(response)
+    
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            payload = {
-                "symbol": symbol,
-                "candles": candles,
-                "timeframe": timeframe
-            }
-            
-            response = await client.post(
-                f"{SIGNAL_GENERATOR_URL}/analyze",
-                json=payload
-            )
-            
-            if response.status_code == 200:
-                signal_data = response.json()
-                print(f"✅ Signal generated for {symbol}: {signal_data.get('signal')}")
-                return signal_data
-            else:
-                print(f"❌ Signal generator error: {response.text}")
-                return None
-                
+        signal_data = await generator_caller.call((symbol, timeframe), analyze)
+        if signal_data is not None:
+            print(f"✅ Signal generated for {symbol}: {signal_data.get('signal')}")
+        return signal_data
+    except CircuitOpenError as e:
+        print(f"⚠️ Signal generator unavailable: {str(e)}")
+        return None
     except Exception as e:
         print(f"❌ Error fetching signal: {str(e)}")
         return None
@@ -150,7 +325,9 @@ async def send_signal_to_trading_app(signal_data: dict):
                 "confidence": signal_data.get("confidence"),
                 "timeframe": signal_data.get("timeframe"),
                 "limit_orders": signal_data.get("limit_orders", False),
-                "reasoning": signal_data.get("reasoning")
+                "reasoning": signal_data.get("reasoning"),
+                "trace_id": signal_data.get("trace_id") or uuid.uuid4().hex,
+                "generated_at": signal_data.get("generated_at") or datetime.utcnow().isoformat()
             }
             
             response = await client.post(
@@ -180,6 +357,227 @@ async def init_supabase_tables():
     except Exception:
         pass
 
+def utc_iso(value: Optional[datetime]) -> Optional[str]:
+    """Aware datetimes -> naive UTC ISO string (the DB stores naive UTC timestamps)"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def exclude_canaries(query):
+    """Drop synthetic probe signals (stored as canary, expired once polled; trace ids canary-...)"""
+    return query.neq("status", "canary").or_("trace_id.is.null,trace_id.not.like.canary-*")
+
+def fetch_all(query_fn, page_size: int = 1000, max_rows: int = 1000000):
+    """Page through a PostgREST query; query_fn() must return a fresh query builder"""
+    rows = []
+    while len(rows) < max_rows:
+        page = query_fn().range(len(rows), len(rows) + page_size - 1).execute()
+        rows.extend(page.data or [])
+        if not page.data or len(page.data) < page_size:
+            break
+    return rows
+
+def account_stats_data():
+    """Latest account state plus pooled investment (blocking)"""
+    supabase = get_supabase_client()
+    
+    account_state = supabase.table("account_state").select("*").order("timestamp", desc=True).limit(1).execute()
+    
+    users = supabase.table("users").select("investment").execute()
+    total_investment = sum(u["investment"] for u in users.data) if users.data else 0
+    
+    # Get current account config
+    current_account = DEMO_ACCOUNT if ACCOUNT_MODE == "demo" else REAL_ACCOUNT
+    current_server = DEMO_SERVER if ACCOUNT_MODE == "demo" else REAL_SERVER
+    
+    return {
+        "account": account_state.data[0] if account_state.data else {},
+        "total_investment": float(total_investment),
+        "account_mode": ACCOUNT_MODE,
+        "account_number": current_account,
+        "server": current_server,
+        "is_demo": ACCOUNT_MODE == "demo"
+    }
+
+def trades_history_data(limit: int):
+    trades = get_supabase_client().table("trades").select("*").order("opened_at", desc=True).limit(limit).execute()
+    return trades.data or []
+
+def user_stats_data(user_id: str):
+    user = get_supabase_client().table("users").select("*").eq("user_id", user_id).execute()
+    return user.data[0] if user.data else None
+
+def signal_queue_data(limit: int = 50):
+    """Pending and in-flight signals, read only (never claims them)"""
+    queued = get_supabase_client().table("signals") \
+        .select("id, symbol, action, volume, status, trace_id, created_at, claimed_at") \
+        .in_("status", ["pending", "processing"]).order("created_at").limit(limit).execute()
+    rows = queued.data or []
+    return {
+        "pending": sum(1 for s in rows if s["status"] == "pending"),
+        "processing": sum(1 for s in rows if s["status"] == "processing"),
+        "signals": rows,
+    }
+
+async def build_dashboard(user_id: Optional[str], trades_limit: int):
+    """Fetch every dashboard section concurrently; a failing section is reported, not fatal"""
+    sections = {
+        "account": lambda: asyncio.to_thread(account_stats_data),
+        "trades": lambda: asyncio.to_thread(trades_history_data, trades_limit),
+        "signals": lambda: asyncio.to_thread(signal_queue_data),
+    }
+    if user_id:
+        sections["user"] = lambda: asyncio.to_thread(user_stats_data, user_id)
+    
+    async def timed(fetch):
+        started = time.perf_counter()
+        result = await asyncio.wait_for(fetch(), DASHBOARD_SECTION_TIMEOUT)
+        return result, (time.perf_counter() - started) * 1000
+    
+    results = await asyncio.gather(*(timed(fetch) for fetch in sections.values()), return_exceptions=True)
+    
+    dashboard = {"generated_at": datetime.utcnow().isoformat(), "errors": {}, "timings_ms": {}}
+    for name, result in zip(sections, results):
+        if isinstance(result, BaseException):
+            dashboard[name] = None
+            dashboard["errors"][name] = "timeout" if isinstance(result, asyncio.TimeoutError) else str(result)
+            print(f"⚠️ Dashboard section {name} failed: {dashboard['errors'][name]}")
+        else:
+            dashboard[name], elapsed = result
+            dashboard["timings_ms"][name] = round(elapsed, 1)
+    
+    # In-memory sections
+    if user_id:
+        dashboard["report"] = user_reports.get(user_id)
+    dashboard["exposure"] = exposure_book.status()
+    dashboard["generator"] = generator_caller.status()
+    dashboard["partial"] = bool(dashboard["errors"])
+    return dashboard
+
+def build_user_reports():
+    """Fetch inputs once and compute every user's report in one pass (blocking)"""
+    supabase = get_supabase_client()
+    now = datetime.utcnow()
+    since = (now - timedelta(days=USER_REPORT_DAYS)).isoformat()
+    
+    users = fetch_all(lambda: supabase.table("users").select("user_id, investment, profit_loss").order("id"))
+    ledger = fetch_all(lambda: supabase.table("investments").select("user_id, amount, created_at").order("id"))
+    # One closing row per day, so the window never hits a row cap
+    account_rows = supabase.rpc("daily_closing_equity", {"p_since": since}).execute().data or []
+    
+    reports = compute_user_reports(users, ledger, account_rows, USER_REPORT_DAYS, now)
+    
+    rows = [{"user_id": uid, "report": report, "computed_at": report["computed_at"]} for uid, report in reports.items()]
+    for i in range(0, len(rows), 500):
+        supabase.table("user_reports").upsert(rows[i:i + 500], on_conflict="user_id").execute()
+    return reports
+
+async def refresh_user_reports():
+    global user_reports
+    started = datetime.utcnow()
+    user_reports = await asyncio.to_thread(build_user_reports)
+    print(f"✅ User reports refreshed: {len(user_reports)} users in {(datetime.utcnow() - started).total_seconds():.2f}s")
+
+async def archive_cold_data():
+    for summary in await asyncio.to_thread(run_archiver, get_supabase_client()):
+        print(f"✅ Archived {summary['rows']} {summary['table']} rows in {summary['chunks']} chunks ({summary['bytes']} bytes)")
+
+def load_exposure_book():
+    """Seed the exposure book from open trades and queued signals (blocking)"""
+    supabase = get_supabase_client()
+    open_trades = fetch_all(lambda: supabase.table("trades").select("ticket, symbol, action, volume").eq("status", "open").order("id"))
+    queued = fetch_all(lambda: supabase.table("signals").select("id, symbol, action, volume").in_("status", ["pending", "processing"]).order("id"))
+    exposure_book.load(open_trades, queued)
+    print(f"✅ Exposure book loaded: {len(open_trades)} open trades, {len(queued)} queued signals")
+
+def load_symbol_specs():
+    """Warm the symbol table from the last specs the EA pushed (blocking)"""
+    supabase = get_supabase_client()
+    specs = fetch_all(lambda: supabase.table("symbol_specs").select("symbol, updated_at, " + ", ".join(SPEC_FIELDS)).order("symbol"))
+    symbol_table.update(specs, datetime.utcnow().isoformat())
+    print(f"✅ Symbol specs loaded: {len(specs)} symbols")
+
+def apply_symbol_spec(signal_data: dict):
+    """Snap prices/volume to the symbol spec and reject signals the EA would refuse"""
+    requested_volume = signal_data["volume"]
+    error = symbol_table.normalize(signal_data, require_spec=SYMBOL_SPECS_REQUIRED)
+    if error:
+        signal_data["status"] = "rejected"
+        signal_data["error"] = error
+        print(f"❌ Signal rejected: {error}")
+    elif signal_data["volume"] != requested_volume:
+        signal_data["requested_volume"] = requested_volume
+    return error
+
+def apply_risk_check(signal_data: dict):
+    """Scale or reject a signal row against the exposure book before it is queued"""
+    decision = exposure_book.check(signal_data["symbol"], signal_data["action"], signal_data["volume"])
+    if decision.action == "scale":
+        signal_data.setdefault("requested_volume", signal_data["volume"])
+        signal_data["volume"] = symbol_table.round_volume(signal_data["symbol"], decision.volume)
+        print(f"⚠️ Signal volume {decision.reason}")
+        if signal_data["volume"] <= 0:
+            signal_data["status"] = "rejected"
+            signal_data["error"] = f"{decision.reason}, below minimum volume"
+            print(f"❌ Signal rejected: {signal_data['error']}")
+    elif decision.action == "reject":
+        signal_data["status"] = "rejected"
+        signal_data["error"] = decision.reason
+        print(f"❌ Signal rejected: {decision.reason}")
+    return decision
+
+def release_expired_leases():
+    """Return signals claimed longer than the lease ago to pending (one bulk UPDATE)"""
+    cutoff = (datetime.utcnow() - timedelta(seconds=SIGNAL_LEASE_SECONDS)).isoformat()
+    response = get_supabase_client().rpc("release_signal_leases", {
+        "p_cutoff": cutoff,
+        "p_max_deliveries": SIGNAL_MAX_DELIVERIES,
+    }).execute()
+    return response.data or []
+
+async def sweep_signal_leases():
+    released = await asyncio.to_thread(release_expired_leases)
+    if released:
+        failed = [r["id"] for r in released if r["status"] == "failed"]
+        for signal_id in failed:
+            exposure_book.release(signal_id)
+        failed = len(failed)
+        print(f"⚠️ Signal leases expired: {len(released) - failed} redelivered, {failed} failed after {SIGNAL_MAX_DELIVERIES} deliveries")
+
+async def expire_stale_signals():
+    """Signals nobody claimed within SIGNAL_PENDING_TTL (incl. orphaned canaries) are stale: expire them in one UPDATE"""
+    cutoff = (datetime.utcnow() - timedelta(seconds=SIGNAL_PENDING_TTL)).isoformat()
+    expired = await asyncio.to_thread(
+        lambda: get_supabase_client().table("signals").update({"status": "expired", "error": "not claimed in time"})
+            .in_("status", ["pending", "canary"]).lt("created_at", cutoff).execute()
+    )
+    for row in expired.data or []:
+        exposure_book.release(row["id"])
+    if expired.data:
+        print(f"⚠️ Expired {len(expired.data)} unclaimed signals older than {SIGNAL_PENDING_TTL}s")
+
+async def prune_account_state():
+    cutoff = (datetime.utcnow() - timedelta(days=ACCOUNT_STATE_PRUNE_DAYS)).isoformat()
+    pruned = await asyncio.to_thread(
+        lambda: get_supabase_client().table("account_state").delete().lt("timestamp", cutoff).execute()
+    )
+    print(f"✅ Pruned {len(pruned.data or [])} account_state rows older than {ACCOUNT_STATE_PRUNE_DAYS} days")
+
+async def run_profit_distribution(total_profit: float):
+    await asyncio.to_thread(distribute_profits, total_profit)
+
+def register_jobs():
+    job_runner.register("distribute_profits", run_profit_distribution, dedicated=True)  # triggered by /api/account/update
+    job_runner.register("user_reports", refresh_user_reports, interval=USER_REPORT_INTERVAL)
+    job_runner.register("signal_leases", sweep_signal_leases, interval=SIGNAL_LEASE_SWEEP_INTERVAL, initial_delay=SIGNAL_LEASE_SWEEP_INTERVAL, dedicated=True)
+    job_runner.register("expire_signals", expire_stale_signals, interval=SIGNAL_EXPIRY_INTERVAL, initial_delay=SIGNAL_EXPIRY_INTERVAL, dedicated=True)
+    if ARCHIVE_ENABLED:
+        job_runner.register("archive", archive_cold_data, interval=ARCHIVE_INTERVAL)
+    if ACCOUNT_STATE_PRUNE_DAYS > 0:
+        job_runner.register("prune_account_state", prune_account_state, interval=86400)
+
 @app.on_event("startup")
 async def startup():
     """Initialize Supabase connection on startup"""
@@ -189,11 +587,26 @@ async def startup():
         print("✅ Supabase connection successful")
     except Exception as e:
         print(f"❌ Supabase connection failed: {e}")
+    
+    try:
+        await asyncio.to_thread(load_exposure_book)
+    except Exception as e:
+        print(f"❌ Exposure book load failed: {e}")
+    
+    try:
+        await asyncio.to_thread(load_symbol_specs)
+    except Exception as e:
+        print(f"❌ Symbol specs load failed: {e}")
+    
+    register_jobs()
+    job_runner.start()
 
 @app.on_event("shutdown")
 async def shutdown():
     """Cleanup on shutdown"""
-    pass
+    await job_runner.drain(JOB_DRAIN_TIMEOUT)
+    if generator_http is not None:
+        await generator_http.aclose()
 
 # Endpoints
 @app.get("/")
@@ -209,10 +622,41 @@ async def health():
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}, 500
 
+@app.get("/api/generator/status")
+async def generator_status():
+    """Circuit breaker state, latency percentiles and call counters for the signal generator"""
+    return generator_caller.status()
+
+@app.get("/api/risk/exposure")
+async def risk_exposure():
+    """Net lots per symbol and currency, caps and risk decision counters"""
+    return exposure_book.status()
+
+@app.get("/api/jobs/status")
+async def jobs_status():
+    """Background jobs: schedule, run/failure/coalesce counters and run-time percentiles"""
+    return job_runner.status()
+
+@app.post("/api/jobs/{name}/run")
+async def run_job(name: str, x_api_key: str = Header(None)):
+    """Trigger a background job now (coalesced with any queued run)"""
+    if x_api_key != API_SECRET_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+    if name not in job_runner.jobs or name == "distribute_profits":
+        raise HTTPException(status_code=404, detail=f"Unknown job: {name}")
+    queued = job_runner.trigger(name)
+    return {"job": name, "queued": queued, "coalesced": not queued}
+
+@app.get("/api/ratelimit/status")
+async def ratelimit_status():
+    """In-flight requests and allowed/limited/shed counters per route class"""
+    return {"enabled": RATE_LIMIT_ENABLED, **rate_limiter.status()}
+
 # ✅ FIXED: Proper POST with API key dependency - SAVE ALL FIELDS
 @app.post("/api/signal")
 async def receive_signal(signal: Signal, request: Request, x_api_key: str = Header(None)):
     """✅ FIXED: Receive trading signal from signal generator WITH ALL FIELDS"""
+    received_at = datetime.utcnow().isoformat()
     try:
         # Verify API key
         if x_api_key != API_SECRET_KEY:
@@ -248,13 +692,22 @@ async def receive_signal(signal: Signal, request: Request, x_api_key: str = Head
             "timeframe": signal.timeframe,
             "limit_orders": signal.limit_orders,  # ✅ NEW
             "reasoning": signal.reasoning,  # ✅ NEW
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat()
+            "status": "canary" if signal.canary else "pending",
+            "trace_id": signal.trace_id or uuid.uuid4().hex,
+            "generated_at": utc_iso(signal.generated_at),
+            "received_at": received_at
+            # created_at is left to the column default (NOW()), so it marks when the insert ran
         }
         
+        decision = None
+        if not signal.canary and apply_symbol_spec(signal_data) is None:
+            decision = apply_risk_check(signal_data)
+        
         response = supabase.table("signals").insert(signal_data).execute()
         
         signal_id = response.data[0]["id"] if response.data else None
+        if signal_id and signal_data["status"] == "pending":
+            exposure_book.reserve(signal_id, signal_data["symbol"], signal_data["action"], signal_data["volume"])
         print(f"✅ Signal stored in Supabase: ID={signal_id}")
         print(f"✅ Limit Orders: {signal.limit_orders}")
         print(f"✅ Reasoning saved: {signal.reasoning[:50] if signal.reasoning else 'N/A'}...")
@@ -264,9 +717,13 @@ async def receive_signal(signal: Signal, request: Request, x_api_key: str = Head
         return {
             "message": "Signal received and stored",
             "signal_id": signal_id,
-            "status": "stored",
+            "trace_id": signal_data["trace_id"],
+            "status": "rejected" if signal_data["status"] == "rejected" else "stored",
             "symbol": signal.symbol,
             "action": signal.action.upper(),
+            "volume": signal_data["volume"],
+            "risk": {"decision": decision.action, "reason": decision.reason} if decision else None,
+            "error": signal_data.get("error"),
             "limit_orders": signal.limit_orders
         }
     except HTTPException:
@@ -280,6 +737,7 @@ async def receive_signal(signal: Signal, request: Request, x_api_key: str = Head
 @app.post("/api/signals/manual")
 async def manual_signal(signal: Signal):
     """Manually send a trading signal (no API key required for testing)"""
+    received_at = datetime.utcnow().isoformat()
     try:
         supabase = get_supabase_client()
         
@@ -295,55 +753,165 @@ async def manual_signal(signal: Signal):
             "limit_orders": signal.limit_orders or False,  # ✅ NEW
             "reasoning": signal.reasoning,  # ✅ NEW
             "status": "pending",
-            "created_at": datetime.utcnow().isoformat()
+            "trace_id": signal.trace_id or uuid.uuid4().hex,
+            "generated_at": utc_iso(signal.generated_at),
+            "received_at": received_at
+            # created_at is left to the column default (NOW()), so it marks when the insert ran
         }
         
+        decision = None
+        if apply_symbol_spec(signal_data) is None:
+            decision = apply_risk_check(signal_data)
+        
         response = supabase.table("signals").insert(signal_data).execute()
         
         signal_id = response.data[0]["id"] if response.data else None
+        if signal_id and signal_data["status"] == "pending":
+            exposure_book.reserve(signal_id, signal_data["symbol"], signal_data["action"], signal_data["volume"])
         print(f"✅ Manual signal stored: {signal.symbol} {signal.action}")
         
         return {
             "success": True,
             "message": "Signal created successfully",
             "signal_id": signal_id,
+            "trace_id": signal_data["trace_id"],
             "signal": {
                 "symbol": signal.symbol,
                 "action": signal.action.upper(),
-                "volume": signal.volume,
+                "volume": signal_data["volume"],
                 "entry": signal.entry,
                 "sl": signal.sl,
                 "tp": signal.tp,
                 "limit_orders": signal.limit_orders,
-                "status": "pending"
-            }
+                "status": signal_data["status"]
+            },
+            "risk": {"decision": decision.action, "reason": decision.reason} if decision else None,
+            "error": signal_data.get("error")
         }
     except Exception as e:
         print(f"❌ Error creating manual signal: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating signal: {str(e)}")
 
 @app.get("/api/signals/pending")
-async def get_pending_signals(x_api_key: str = Header(None)):
-    """MT5 EA polls this endpoint for new signals"""
+async def get_pending_signals(
+    request: Request,
+    fmt: str = Query("json", alias="format"),
+    canary: bool = False,
+    x_api_key: str = Header(None)
+):
+    """MT5 EA polls this endpoint for new signals (?format=compact for the line format, ?canary=true for probes)"""
     try:
         if x_api_key != API_SECRET_KEY:
             raise HTTPException(status_code=403, detail="Invalid API key")
         
         supabase = get_supabase_client()
         
-        signals = supabase.table("signals").select("*").eq("status", "pending").order("created_at", desc=False).limit(10).execute()
+        # Canary signals travel the same path but are only visible to the probe
+        status, claimed_status = ("canary", "expired") if canary else ("pending", "processing")
+        
+        signals = supabase.table("signals").select("*").eq("status", status).order("created_at", desc=False).limit(10).execute()
         
         if signals.data:
             signal_ids = [s["id"] for s in signals.data]
-            supabase.table("signals").update({"status": "processing"}).in_("id", signal_ids).execute()
+            claimed_at = datetime.utcnow().isoformat()
+            supabase.table("signals").update({"status": claimed_status, "claimed_at": claimed_at}).in_("id", signal_ids).execute()
+            for s in signals.data:
+                s["claimed_at"] = claimed_at
             print(f"✅ Fetched {len(signals.data)} pending signals for MT5 EA")
         
-        return signals.data or []
+        if fmt == "compact":
+            return compact_response(signals.data or [])
+        return negotiate(request, signals.data or [])
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching signals: {str(e)}")
 
+@app.post("/api/symbols/specs")
+async def update_symbol_specs(batch: SymbolSpecBatch, x_api_key: str = Header(None)):
+    """MT5 EA pushes contract specs (digits, tick size, volume limits, stop level) for its symbols"""
+    try:
+        if x_api_key != API_SECRET_KEY:
+            raise HTTPException(status_code=403, detail="Invalid API key")
+        
+        updated_at = datetime.utcnow().isoformat()
+        rows = [{**spec.model_dump(), "updated_at": updated_at} for spec in batch.specs]
+        symbol_table.update(rows, updated_at)
+        
+        if rows:
+            get_supabase_client().table("symbol_specs").upsert(rows, on_conflict="symbol").execute()
+        
+        print(f"✅ Symbol specs updated: {len(rows)} symbols")
+        return {"message": "Symbol specs updated", "symbols": len(rows)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating symbol specs: {str(e)}")
+
+@app.get("/api/symbols/specs")
+async def get_symbol_specs():
+    """Symbol specs currently used to normalize incoming signals"""
+    return {"required": SYMBOL_SPECS_REQUIRED, "symbols": symbol_table.status()}
+
+@app.post("/api/signals/ack")
+async def ack_signals(batch: SignalAckBatch, x_api_key: str = Header(None)):
+    """MT5 EA reports the outcome of claimed signals, many per request"""
+    try:
+        if x_api_key != API_SECRET_KEY:
+            raise HTTPException(status_code=403, detail="Invalid API key")
+        
+        invalid = [a.signal_id for a in batch.acks if a.status not in ACK_STATUSES]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid ack status for signals {invalid}, expected one of {list(ACK_STATUSES)}")
+        
+        if not batch.acks:
+            return {"acked": 0, "ignored": []}
+        
+        # Last ack per signal wins; the whole batch is one UPDATE ... FROM jsonb_to_recordset
+        acks = {a.signal_id: a.model_dump() for a in batch.acks}
+        supabase = get_supabase_client()
+        response = supabase.rpc("ack_signals", {
+            "p_acks": list(acks.values()),
+            "p_now": datetime.utcnow().isoformat(),
+        }).execute()
+        
+        acked = {r["id"]: r for r in response.data or []}
+        for a in acks.values():
+            row = acked.get(a["signal_id"])
+            if a["status"] != "executed":
+                exposure_book.release(a["signal_id"])
+            elif a["signal_id"] not in exposure_book.reservations and row and a["ticket"] is not None:
+                # Late ack after the lease sweep failed the signal and released its reservation
+                exposure_book.open(a["ticket"], row["symbol"], row["action"], float(row["volume"]))
+            else:
+                exposure_book.fill(a["signal_id"], a["ticket"])
+        ignored = [signal_id for signal_id in acks if signal_id not in acked]  # unknown or already final
+        print(f"✅ Acked {len(acked)} signals" + (f", ignored {ignored}" if ignored else ""))
+        return {"acked": len(acked), "ignored": ignored}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error acknowledging signals: {str(e)}")
+
+@app.get("/api/signals/latency")
+async def get_signal_latency(hours: int = Query(24, ge=1, le=24 * 30)):
+    """Per-stage signal pipeline latency percentiles (generated -> confirmed)"""
+    try:
+        supabase = get_supabase_client()
+        since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        
+        # Newest first, so a truncated window keeps the most recent signals
+        rows = await asyncio.to_thread(
+            fetch_all,
+            lambda: exclude_canaries(supabase.table("signals").select(", ".join(LATENCY_STAGES)))
+                .gte("created_at", since).order("id", desc=True),
+            max_rows=EQUITY_MAX_ROWS
+        )
+        
+        return {"hours": hours, "signals": len(rows), "stages": stage_latency(rows)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing signal latency: {str(e)}")
+
 @app.post("/api/trades/confirm")
 async def confirm_trade(trade: TradeConfirmation, x_api_key: str = Header(None)):
     """MT5 EA confirms trade execution"""
@@ -353,23 +921,77 @@ async def confirm_trade(trade: TradeConfirmation, x_api_key: str = Header(None))
         
         supabase = get_supabase_client()
         
+        confirmed_at = datetime.utcnow().isoformat()
+        
         supabase.table("trades").insert({
             "ticket": trade.ticket,
+            "signal_id": trade.signal_id,
+            "trace_id": trade.trace_id,
             "symbol": trade.symbol,
             "action": trade.action,
             "volume": trade.volume,
             "open_price": trade.price,
             "status": "open",
-            "opened_at": datetime.utcnow().isoformat()
+            "opened_at": confirmed_at
         }).execute()
         
-        print(f"✅ Trade confirmed: {trade.symbol} {trade.action}")
+        if trade.signal_id:
+            supabase.table("signals").update({
+                "status": "executed",
+                "ticket": trade.ticket,
+                "executed_at": trade.executed_at or confirmed_at,
+                "confirmed_at": confirmed_at
+            }).eq("id", trade.signal_id).execute()
+        
+        exposure_book.open(trade.ticket, trade.symbol, trade.action, trade.volume, trade.signal_id)
+        
+        print(f"✅ Trade confirmed: {trade.symbol} {trade.action} (signal={trade.signal_id}, trace={trade.trace_id})")
         return {"message": "Trade confirmed"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error confirming trade: {str(e)}")
 
+def sync_trades(positions: List[dict], deals: List[dict]) -> dict:
+    """Diff the EA's snapshot against open trades and apply it in bulk upserts (blocking)"""
+    supabase = get_supabase_client()
+    
+    open_trades = fetch_all(lambda: supabase.table("trades").select(", ".join(TRADE_COLUMNS)).eq("status", "open").order("ticket"))
+    
+    # Live tickets the DB doesn't have open may still exist (e.g. marked closed): keep their signal_id/opened_at
+    open_tickets = {t["ticket"] for t in open_trades}
+    missing = [p["ticket"] for p in positions if p["ticket"] not in open_tickets]
+    known_trades = supabase.table("trades").select("ticket").in_("ticket", missing).execute().data if missing else []
+    
+    new_rows, rows, summary = reconcile_positions(open_trades, positions, deals, datetime.utcnow().isoformat(), known_trades)
+    
+    if new_rows:
+        supabase.table("trades").upsert(new_rows, on_conflict="ticket").execute()
+    if rows:
+        supabase.table("trades").upsert(rows, on_conflict="ticket").execute()
+    if new_rows or rows:
+        print(f"✅ Trades reconciled: {summary}")
+    return summary
+
+@app.post("/api/positions/reconcile")
+async def reconcile_trades(snapshot: PositionSnapshot, x_api_key: str = Header(None)):
+    """MT5 EA reports all open positions and recent closing deals; trades table is synced in bulk writes"""
+    try:
+        if x_api_key != API_SECRET_KEY:
+            raise HTTPException(status_code=403, detail="Invalid API key")
+        
+        positions = [p.model_dump() for p in snapshot.positions]
+        exposure_book.sync(positions)
+        
+        # DB reads and writes run in a worker thread so the EA's other calls aren't blocked behind them
+        summary = await asyncio.to_thread(sync_trades, positions, [d.model_dump() for d in snapshot.deals])
+        
+        return {"message": "Trades reconciled", **summary}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reconciling trades: {str(e)}")
+
 @app.post("/api/account/update")
 async def update_account(account: AccountUpdate, x_api_key: str = Header(None)):
     """MT5 EA sends account updates"""
@@ -388,7 +1010,7 @@ async def update_account(account: AccountUpdate, x_api_key: str = Header(None)):
             "timestamp": datetime.utcnow().isoformat()
         }).execute()
         
-        await distribute_profits(account.profit)
+        job_runner.trigger("distribute_profits", total_profit=account.profit)
         
         print(f"✅ Account updated: Balance={account.balance}, Profit={account.profit}")
         return {"message": "Account updated"}
@@ -411,6 +1033,13 @@ async def create_user(user: User):
             "created_at": datetime.utcnow().isoformat()
         }).execute()
         
+        if user.investment:
+            supabase.table("investments").insert({
+                "user_id": user.user_id,
+                "amount": user.investment,
+                "created_at": datetime.utcnow().isoformat()
+            }).execute()
+        
         print(f"✅ User created: {user.user_id}")
         return {"message": "User created", "user_id": user.user_id}
     except Exception as e:
@@ -431,6 +1060,11 @@ async def user_invest(user_id: str, investment: UserInvestment):
         new_investment = current_investment + investment.amount
         
         supabase.table("users").update({"investment": new_investment}).eq("user_id", user_id).execute()
+        supabase.table("investments").insert({
+            "user_id": user_id,
+            "amount": investment.amount,
+            "created_at": datetime.utcnow().isoformat()
+        }).execute()
         
         print(f"✅ Investment added: {user_id} +${investment.amount}")
         return {"message": "Investment added", "amount": investment.amount, "total": new_investment}
@@ -443,44 +1077,106 @@ async def user_invest(user_id: str, investment: UserInvestment):
 async def get_user_stats(user_id: str):
     """Get user's investment and profit/loss"""
     try:
-        supabase = get_supabase_client()
-        
-        user = supabase.table("users").select("*").eq("user_id", user_id).execute()
+        user = user_stats_data(user_id)
         
-        if not user.data:
+        if user is None:
             raise HTTPException(status_code=404, detail="User not found")
         
-        return user.data[0]
+        return user
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching user stats: {str(e)}")
 
+@app.get("/api/users/{user_id}/report")
+async def get_user_report(user_id: str, request: Request):
+    """Precomputed performance report (ROI, daily/weekly P/L, share of pool over time)"""
+    try:
+        report = user_reports.get(user_id)
+        
+        if report is None:
+            supabase = get_supabase_client()
+            stored = supabase.table("user_reports").select("report").eq("user_id", user_id).execute()
+            if not stored.data:
+                raise HTTPException(status_code=404, detail="Report not found")
+            report = stored.data[0]["report"]
+        
+        return negotiate(request, report)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching user report: {str(e)}")
+
 @app.get("/api/account/stats")
 async def get_account_stats():
     """Get current account statistics"""
+    try:
+        return account_stats_data()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching account stats: {str(e)}")
+
+@app.get("/api/dashboard")
+async def get_dashboard(
+    request: Request,
+    user_id: Optional[str] = None,
+    trades: int = Query(20, ge=1, le=200)
+):
+    """Account, trades, signal queue, exposure and (optionally) user stats/report in one response"""
+    try:
+        dashboard = await dashboard_cache.get_or_compute((user_id, trades), lambda: build_dashboard(user_id, trades))
+        return negotiate(request, dashboard)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building dashboard: {str(e)}")
+
+@app.get("/api/account/equity")
+async def get_account_equity(
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = Query(500, ge=3, le=5000)
+):
+    """Equity/balance curve with drawdown and returns, LTTB-downsampled to ~points"""
     try:
         supabase = get_supabase_client()
         
-        account_state = supabase.table("account_state").select("*").order("timestamp", desc=True).limit(1).execute()
+        end = utc_iso(end) or datetime.utcnow().isoformat()
+        start = utc_iso(start) or (datetime.utcnow() - timedelta(days=7)).isoformat()
         
-        users = supabase.table("users").select("investment").execute()
-        total_investment = sum(u["investment"] for u in users.data) if users.data else 0
+        # Thinned in SQL to a few rows per chart point, so cost doesn't grow with history
+        span = (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+        bucket_seconds = max(1, math.ceil(span / (points * EQUITY_BUCKETS_PER_POINT)))
+        response = await asyncio.to_thread(
+            lambda: supabase.rpc("equity_buckets", {
+                "p_start": start,
+                "p_end": end,
+                "p_bucket_seconds": bucket_seconds,
+            }).execute()
+        )
         
-        # Get current account config
-        current_account = DEMO_ACCOUNT if ACCOUNT_MODE == "demo" else REAL_ACCOUNT
-        current_server = DEMO_SERVER if ACCOUNT_MODE == "demo" else REAL_SERVER
+        result = equity_series(response.data or [], points)
+        result.update({"start": start, "end": end, "bucket_seconds": bucket_seconds})
+        return negotiate(request, result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching equity curve: {str(e)}")
+
+@app.get("/api/archive/index")
+async def get_archive_index(table: str, start: Optional[str] = None, end: Optional[str] = None, record_id: Optional[int] = None):
+    """Archived ranges for a table, filtered by time overlap or by the id they contain"""
+    try:
+        supabase = get_supabase_client()
         
-        return {
-            "account": account_state.data[0] if account_state.data else {},
-            "total_investment": float(total_investment),
-            "account_mode": ACCOUNT_MODE,
-            "account_number": current_account,
-            "server": current_server,
-            "is_demo": ACCOUNT_MODE == "demo"
-        }
+        query = supabase.table("archive_index").select("*").eq("table_name", table)
+        if record_id is not None:
+            query = query.lte("min_id", record_id).gte("max_id", record_id)
+        if start:
+            query = query.gte("range_end", start)
+        if end:
+            query = query.lte("range_start", end)
+        
+        ranges = query.order("range_start").execute()
+        return ranges.data or []
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching account stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching archive index: {str(e)}")
 
 @app.get("/api/account/config")
 async def get_account_config(x_api_key: str = Header(None)):
@@ -513,39 +1209,32 @@ async def get_account_config(x_api_key: str = Header(None)):
         raise HTTPException(status_code=500, detail=f"Error getting account config: {str(e)}")
 
 @app.get("/api/trades/history")
-async def get_trades_history(limit: int = 50):
+async def get_trades_history(request: Request, limit: int = 50):
     """Get trade history"""
     try:
-        supabase = get_supabase_client()
-        
-        trades = supabase.table("trades").select("*").order("opened_at", desc=True).limit(limit).execute()
-        
-        return trades.data or []
+        return negotiate(request, trades_history_data(limit))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching trades: {str(e)}")
 
-async def distribute_profits(total_profit: float):
-    """Distribute profits/losses proportionally to users"""
-    try:
-        supabase = get_supabase_client()
-        
-        users = supabase.table("users").select("user_id, investment").gt("investment", 0).execute()
-        
-        if not users.data:
-            return
-        
-        total_investment = sum(u["investment"] for u in users.data)
-        
-        if total_investment > 0:
-            for user in users.data:
-                user_share = user["investment"] / total_investment
-                user_profit = total_profit * user_share
-                
-                supabase.table("users").update({"profit_loss": user_profit}).eq("user_id", user["user_id"]).execute()
-                
-        print(f"✅ Profits distributed: ${total_profit}")
-    except Exception as e:
-        print(f"❌ Error distributing profits: {e}")
+def distribute_profits(total_profit: float):
+    """Distribute profits/losses proportionally to users (blocking; runs as a background job)"""
+    supabase = get_supabase_client()
+    
+    users = supabase.table("users").select("user_id, investment").gt("investment", 0).execute()
+    
+    if not users.data:
+        return
+    
+    total_investment = sum(u["investment"] for u in users.data)
+    
+    if total_investment > 0:
+        for user in users.data:
+            user_share = user["investment"] / total_investment
+            user_profit = total_profit * user_share
+            
+            supabase.table("users").update({"profit_loss": user_profit}).eq("user_id", user["user_id"]).execute()
+            
+    print(f"✅ Profits distributed: ${total_profit}")
 
 if __name__ == "__main__":
     import uvicorn
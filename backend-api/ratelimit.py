@@ -0,0 +1,209 @@
+"""
+Admission control: per-key token buckets and priority load shedding
+
+Every request is mapped to a route class (ea, ingest, write, read). Each
+(identity, class) pair gets its own token bucket, where identity is the
+API key if the request carries the valid one, otherwise the client IP.
+The IP is the socket peer unless TRUSTED_PROXY_HOPS is set: behind N
+trusted proxies it is the Nth X-Forwarded-For hop from the right (what
+the outermost proxy saw). Any hop left of that is client-supplied, so
+XFF is ignored entirely when the API is reached directly. On top of
+that, a global in-flight counter sheds low-priority classes first:
+reads are rejected well before EA polling and trade confirmation are.
+
+Rejections are 429 with Retry-After. The hot path is a dict lookup plus
+a constant-time bucket refill.
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+# Route class -> (tokens per second, burst)
+DEFAULT_RATES = {
+    "ea": (20.0, 40),
+    "ingest": (5.0, 20),
+    "write": (2.0, 10),
+    "read": (10.0, 30),
+}
+
+# Route class -> share of MAX_INFLIGHT it may use before being shed.
+# Higher = shed later. EA traffic is only refused at full saturation.
+SHED_THRESHOLDS = {
+    "ea": 1.0,
+    "ingest": 0.9,
+    "write": 0.75,
+    "read": 0.6,
+}
+
+EXACT_ROUTES = {
+    ("GET", "/api/signals/pending"): "ea",
+    ("POST", "/api/trades/confirm"): "ea",
+    ("POST", "/api/account/update"): "ea",
+    ("POST", "/api/positions/reconcile"): "ea",
+    ("POST", "/api/signals/ack"): "ea",
+    ("POST", "/api/symbols/specs"): "ea",
+    ("GET", "/api/account/config"): "ea",
+    ("POST", "/api/signal"): "ingest",
+    ("POST", "/api/signals/manual"): "ingest",
+}
+
+EXEMPT_PATHS = {"/", "/health", "/docs", "/openapi.json"}
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class for a request, None if exempt from limiting"""
+    if path in EXEMPT_PATHS or method == "OPTIONS":
+        return None
+    route_class = EXACT_ROUTES.get((method, path))
+    if route_class:
+        return route_class
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+def _rates_from_env() -> Dict[str, Tuple[float, int]]:
+    """RATE_LIMIT_<CLASS>=<per_second>,<burst> overrides the defaults"""
+    rates = dict(DEFAULT_RATES)
+    for route_class in rates:
+        value = os.getenv(f"RATE_LIMIT_{route_class.upper()}")
+        if value:
+            per_second, burst = value.split(",")
+            rates[route_class] = (float(per_second), int(burst))
+    return rates
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, rates: Dict[str, Tuple[float, int]], max_inflight: int = 64, max_keys: int = 10000):
+        self.rates = rates
+        self.max_inflight = max_inflight
+        self.max_keys = max_keys
+        self.inflight = 0
+        self.buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.counters = {c: {"allowed": 0, "limited": 0, "shed": 0} for c in rates}
+
+    def _bucket(self, identity: str, route_class: str) -> TokenBucket:
+        key = (identity, route_class)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.buckets.popitem(last=False)
+            bucket = TokenBucket(*self.rates[route_class])
+            self.buckets[key] = bucket
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, identity: str, route_class: str) -> float:
+        """0 if the request may proceed, else the Retry-After in seconds"""
+        counters = self.counters[route_class]
+        if self.inflight >= self.max_inflight * SHED_THRESHOLDS[route_class]:
+            counters["shed"] += 1
+            return 1.0
+        retry_after = self._bucket(identity, route_class).take()
+        if retry_after:
+            counters["limited"] += 1
+            return retry_after
+        counters["allowed"] += 1
+        return 0.0
+
+    def status(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "tracked_keys": len(self.buckets),
+            "classes": {
+                c: {"rate": r, "burst": b, "shed_at": int(self.max_inflight * SHED_THRESHOLDS[c]), **self.counters[c]}
+                for c, (r, b) in self.rates.items()
+            },
+        }
+
+
+def _identity(scope, api_key: Optional[bytes], proxy_hops: int = 0) -> str:
+    """Arbitrary keys or XFF values would each get a fresh bucket, so only the real key and trusted hops count"""
+    key = None
+    forwarded = None
+    for name, value in scope["headers"]:
+        if name == b"x-api-key":
+            key = value
+        elif name == b"x-forwarded-for":
+            forwarded = value
+    if api_key and key == api_key:
+        return "key"
+    if proxy_hops and forwarded:
+        hops = forwarded.decode("latin-1").split(",")
+        if len(hops) >= proxy_hops:
+            return "ip:" + hops[-proxy_hops].strip()
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying a RateLimiter to every HTTP request"""
+
+    def __init__(self, app, limiter: RateLimiter, api_key: Optional[str] = None, proxy_hops: int = 0):
+        self.app = app
+        self.limiter = limiter
+        self.api_key = api_key.encode("latin-1") if api_key else None
+        self.proxy_hops = proxy_hops  # reverse proxies in front of the API whose X-Forwarded-For is trusted
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            return await self.app(scope, receive, send)
+
+        retry_after = self.limiter.admit(_identity(scope, self.api_key, self.proxy_hops), route_class)
+        if retry_after:
+            return await self._reject(send, route_class, retry_after)
+
+        self.limiter.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.inflight -= 1
+
+    async def _reject(self, send, route_class: str, retry_after: float):
+        body = orjson.dumps({"detail": f"Rate limit exceeded for {route_class} requests"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def limiter_from_env() -> RateLimiter:
+    return RateLimiter(
+        _rates_from_env(),
+        max_inflight=int(os.getenv("MAX_INFLIGHT", "64")),
+        max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000")),
+    )
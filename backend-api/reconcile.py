@@ -0,0 +1,106 @@
+"""
+Reconcile the trades table against the EA's positions snapshot
+
+The EA reports every open position and the deals that closed positions
+recently. Diffing by ticket with set operations gives, in O(n):
+
+- opened:  in the snapshot but not open in the DB (missed confirmation)
+- updated: open in both and the floating profit or the volume (after a
+           partial close) changed
+- closed:  open in the DB but gone from the snapshot; close price,
+           profit and time come from the position's closing deals when
+           reported (partial closes are summed)
+
+Changes come back as two lists for two bulk upserts on ticket: new rows
+with every column, and rows that already exist without signal_id and
+opened_at, so those are never overwritten.
+"""
+from typing import Dict, List, Optional, Tuple
+
+# Every upserted row carries exactly these columns (PostgREST bulk writes
+# need uniform keys)
+TRADE_COLUMNS = ("ticket", "signal_id", "symbol", "action", "volume", "open_price", "close_price",
+                 "profit", "status", "opened_at", "closed_at", "updated_at")
+UPDATE_COLUMNS = tuple(c for c in TRADE_COLUMNS if c not in ("signal_id", "opened_at"))
+
+
+def merge_deals(deals: List[dict]) -> Dict[int, dict]:
+    """Closing deals -> one per position: summed profit, volume-weighted close price, latest time"""
+    merged: Dict[int, dict] = {}
+    for d in deals:
+        ticket = int(d["ticket"])
+        volume = d.get("volume") or 0.0
+        m = merged.setdefault(ticket, {"profit": 0.0, "volume": 0.0, "notional": 0.0, "close_price": None, "closed_at": None})
+        m["profit"] += d["profit"]
+        m["volume"] += volume
+        m["notional"] += volume * d["close_price"]
+        if not m["closed_at"] or (d.get("closed_at") or "") >= m["closed_at"]:
+            m["closed_at"] = d.get("closed_at")
+            m["close_price"] = d["close_price"]
+    for m in merged.values():
+        if m["volume"] > 0:
+            m["close_price"] = m["notional"] / m["volume"]
+        m["profit"] = round(m["profit"], 2)
+    return merged
+
+
+def reconcile_positions(open_trades: List[dict], positions: List[dict], deals: List[dict], now: str,
+                        known_trades: Optional[List[dict]] = None) -> Tuple[List[dict], List[dict], dict]:
+    """known_trades: existing non-open rows for live tickets (a closed row the EA still holds)"""
+    db_open: Dict[int, dict] = {int(t["ticket"]): t for t in open_trades if t.get("ticket") is not None}
+    known: Dict[int, dict] = {int(t["ticket"]): t for t in known_trades or []}
+    live: Dict[int, dict] = {int(p["ticket"]): p for p in positions}
+    closing_deals = merge_deals(deals)
+
+    db_tickets = db_open.keys()
+    live_tickets = live.keys()
+
+    new_rows: List[dict] = []
+    rows: List[dict] = []
+
+    opened = live_tickets - db_tickets
+    for ticket in opened:
+        p = live[ticket]
+        (rows if ticket in known else new_rows).append({
+            "ticket": ticket,
+            "symbol": p["symbol"],
+            "action": p["action"],
+            "volume": p["volume"],
+            "open_price": p["price"],
+            "profit": p.get("profit"),
+            "status": "open",
+            "opened_at": p.get("opened_at") or now,
+            "updated_at": now,
+        })
+
+    updated = 0
+    for ticket in live_tickets & db_tickets:
+        row, p = db_open[ticket], live[ticket]
+        profit = row.get("profit") if p.get("profit") is None else p["profit"]
+        if row.get("profit") == profit and row.get("volume") == p["volume"]:
+            continue
+        rows.append({**row, "profit": profit, "volume": p["volume"], "updated_at": now})
+        updated += 1
+
+    closed = db_tickets - live_tickets
+    for ticket in closed:
+        row, deal = db_open[ticket], closing_deals.get(ticket, {})
+        rows.append({
+            **row,
+            "status": "closed",
+            "close_price": deal.get("close_price", row.get("close_price")),
+            "profit": deal.get("profit", row.get("profit")),
+            "closed_at": deal.get("closed_at") or now,
+            "updated_at": now,
+        })
+
+    new_rows = [{c: r.get(c) for c in TRADE_COLUMNS} for r in new_rows]
+    rows = [{c: r.get(c) for c in UPDATE_COLUMNS} for r in rows]
+    summary = {
+        "opened": len(opened),
+        "updated": updated,
+        "closed": len(closed),
+        "closed_without_deal": len(closed - closing_deals.keys()),
+        "unchanged": len(live_tickets & db_tickets) - updated,
+    }
+    return new_rows, rows, summary
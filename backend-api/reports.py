@@ -0,0 +1,110 @@
+"""
+Per-user performance reports, computed for all users in one batch
+
+Inputs are fetched once per run: users, the investments ledger and the
+closing account_state row of each day in the report window. Pool P/L per day comes from the
+change in closing equity net of that day's deposits. Each user's share of
+the pool per day comes from cumulative ledger sums; a day's P/L is split
+by the shares held at the start of that day. Everything is a
+(users x days) NumPy matrix, so a run is linear in users and days.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+
+def _day_index(timestamps: List[str], first_day: np.datetime64, days: int) -> np.ndarray:
+    """ISO timestamps -> day offset from first_day, clipped into [0, days)"""
+    if not timestamps:
+        return np.empty(0, dtype=np.int64)
+    d = np.asarray([t[:10] for t in timestamps], dtype="datetime64[D]")
+    return np.clip((d - first_day).astype(np.int64), 0, days - 1)
+
+
+def compute_user_reports(users: List[dict], ledger: List[dict], account_rows: List[dict], days: int, now: datetime) -> Dict[str, dict]:
+    if not users:
+        return {}
+
+    first_day = np.datetime64((now - timedelta(days=days - 1)).date(), "D")
+    dates = (first_day + np.arange(days)).astype(str).tolist()
+    user_ids = [u["user_id"] for u in users]
+    user_pos = {uid: i for i, uid in enumerate(user_ids)}
+    investment = np.asarray([u.get("investment") or 0.0 for u in users], dtype=np.float64)
+    profit_loss = np.asarray([u.get("profit_loss") or 0.0 for u in users], dtype=np.float64)
+
+    # Contributions matrix (users x days); anything before the window lands on day 0
+    contributions = np.zeros((len(users), days))
+    ledger = [e for e in ledger if e["user_id"] in user_pos]
+    if ledger:
+        rows = np.asarray([user_pos[e["user_id"]] for e in ledger])
+        cols = _day_index([e["created_at"] for e in ledger], first_day, days)
+        np.add.at(contributions, (rows, cols), np.asarray([e["amount"] for e in ledger], dtype=np.float64))
+
+    # Investment that predates the ledger (not covered by its rows) counts from day 0
+    contributions[:, 0] += investment - contributions.sum(axis=1)
+
+    holdings = np.cumsum(contributions, axis=1)
+    pool = holdings.sum(axis=0)
+    share = np.divide(holdings, pool, out=np.zeros_like(holdings), where=pool > 0)
+
+    # Daily closing equity of the pool account (last row per day, carried forward)
+    closing = np.full(days, np.nan)
+    if account_rows:
+        cols = _day_index([r["timestamp"] for r in account_rows], first_day, days)
+        closing[cols] = np.asarray([r["equity"] for r in account_rows], dtype=np.float64)  # rows are day-ordered: last wins
+    filled = np.where(np.isnan(closing), 0, np.arange(days))
+    np.maximum.accumulate(filled, out=filled)
+    closing = closing[filled]
+
+    deposits = contributions.sum(axis=0)
+    pool_pnl = np.zeros(days)
+    pool_pnl[1:] = np.diff(closing) - deposits[1:]
+    pool_pnl = np.nan_to_num(pool_pnl)
+
+    # Day D's P/L is split by the shares held going into day D, so same-day deposits don't earn it
+    opening_share = np.concatenate([share[:, :1], share[:, :-1]], axis=1)
+    user_pnl = opening_share * pool_pnl  # (users x days)
+
+    week_starts = list(range(days % 7, days, 7))
+    weekly = np.add.reduceat(user_pnl[:, days % 7:], np.arange(0, days - days % 7, 7), axis=1) if days >= 7 else np.zeros((len(users), 0))
+    roi = np.divide(profit_loss, investment, out=np.zeros_like(investment), where=investment > 0)
+
+    computed_at = now.isoformat()
+    reports = {}
+    for i, uid in enumerate(user_ids):
+        reports[uid] = {
+            "user_id": uid,
+            "investment": float(investment[i]),
+            "profit_loss": float(profit_loss[i]),
+            "roi": float(roi[i]),
+            "share": float(share[i, -1]),
+            "window_pnl": round(float(user_pnl[i].sum()), 2),
+            "daily": [
+                {"date": dates[d], "pnl": round(float(user_pnl[i, d]), 2), "share": round(float(share[i, d]), 6)}
+                for d in range(days)
+            ],
+            "weekly": [
+                {"week_start": dates[week_starts[w]], "pnl": round(float(weekly[i, w]), 2)}
+                for w in range(weekly.shape[1])
+            ],
+            "computed_at": computed_at,
+        }
+    return reports
+
+
+def _check_same_day_deposit():
+    """A deposit earns nothing of the P/L made on the day it arrives"""
+    now = datetime(2026, 1, 8, 12)
+    users = [{"user_id": "a", "investment": 1000.0}, {"user_id": "b", "investment": 1000.0}]
+    ledger = [{"user_id": "b", "amount": 1000.0, "created_at": "2026-01-08T09:00:00"}]
+    account_rows = [{"timestamp": "2026-01-07T23:00:00", "equity": 1000.0},
+                    {"timestamp": "2026-01-08T23:00:00", "equity": 2050.0}]
+    reports = compute_user_reports(users, ledger, account_rows, 2, now)
+    assert reports["a"]["daily"][-1]["pnl"] == 50.0, reports["a"]["daily"]
+    assert reports["b"]["daily"][-1]["pnl"] == 0.0, reports["b"]["daily"]
+    print("✅ Same-day deposit earns no P/L for that day")
+
+
+if __name__ == "__main__":
+    _check_same_day_deposit()
@@ -0,0 +1,296 @@
+"""
+Resilience layer for outbound calls (signal generator)
+
+- CircuitBreaker: closed -> open after N consecutive failures, a single
+  half-open probe after the reset timeout
+- Exponential backoff with full jitter between retries, all within an
+  optional overall deadline per call
+- Hedged requests: if an attempt is slower than the observed latency
+  percentile, a second identical request is raced against it
+- Last-good-result cache per key, served when the breaker is open or
+  every attempt failed
+- CoalescingCache: short-lived results shared by concurrent identical
+  requests (single flight)
+"""
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Raised when the breaker is open and there is no cached result"""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, probe_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout if probe_timeout is not None else reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def _reopen(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """May a request go out right now?"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # Half-open: let exactly one probe through
+        if self._probe_in_flight:
+            # A probe that never reported back (lost/hung) counts as failed
+            if time.monotonic() - self._probe_started >= self.probe_timeout:
+                self._reopen()
+            return False
+        self._probe_in_flight = True
+        self._probe_started = time.monotonic()
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._reopen()
+
+    def abandon(self):
+        """The caller gave up (e.g. cancelled) without a result: a pending probe is treated as failed"""
+        if self.state == self.HALF_OPEN and self._probe_in_flight:
+            self._reopen()
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._items: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if time.monotonic() > expires:
+            del self._items[key]
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        self._items = {k: item for k, item in self._items.items() if item[0] >= now}
+
+
+class CoalescingCache:
+    """Short TTL cache where concurrent misses for one key share a single computation"""
+
+    def __init__(self, ttl: float, max_keys: int = 1000):
+        self.cache = TTLCache(ttl)
+        self.max_keys = max_keys
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.counters = {"hits": 0, "coalesced": 0, "computed": 0}
+
+    async def get_or_compute(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.cache.get(key)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["computed"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        # Shielded: one waiter disconnecting doesn't cancel the computation for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if len(self.cache) >= self.max_keys:
+            self.cache.purge_expired()
+        self.cache.set(key, task.result())
+
+    def status(self) -> dict:
+        return {"ttl": self.cache.ttl, "keys": len(self.cache), "inflight": len(self._inflight), **self.counters}
+
+
+class ResilientCaller:
+    """Wraps an async call with breaker, retries, hedging and fallback cache"""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 10.0,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 5.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge_percentile: float = 95.0,
+        cache_ttl: float = 60.0,
+        deadline: Optional[float] = None,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline  # cap on a whole call (attempts, hedges and backoff); None = uncapped
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.cache = TTLCache(cache_ttl)
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "hedges": 0, "short_circuited": 0, "cache_fallbacks": 0}
+
+    def hedge_delay(self) -> Optional[float]:
+        """Fire a second request once the first is slower than this (None = don't hedge)"""
+        p = self.latency.percentile(self.hedge_percentile)
+        if p is None or p >= self.timeout:
+            return None
+        return p
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]], deadline_at: float) -> Any:
+        start = time.monotonic()
+        result = await asyncio.wait_for(fn(), timeout=max(0.0, min(self.timeout, deadline_at - start)))
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]], deadline_at: float) -> Any:
+        primary = asyncio.ensure_future(self._timed(fn, deadline_at))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await primary
+
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.stats["hedges"] += 1
+            pending.add(asyncio.ensure_future(self._timed(fn, deadline_at)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _fallback(self, key: Hashable, error: Exception) -> Any:
+        cached = self.cache.get(key)
+        if cached is None:
+            raise error
+        self.stats["cache_fallbacks"] += 1
+        print(f"⚠️ {self.name}: serving cached result for {key} ({error})")
+        if isinstance(cached, dict):
+            return {**cached, "cached": True}
+        return cached
+
+    async def call(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn with retries; fn must raise on failure"""
+        self.stats["calls"] += 1
+        last_error: Exception = CircuitOpenError(f"{self.name} circuit open")
+        deadline_at = time.monotonic() + (self.deadline if self.deadline is not None else math.inf)
+
+        for attempt in range(self.max_attempts):
+            if time.monotonic() >= deadline_at:
+                break
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += 1
+                break
+            try:
+                result = await self._hedged(fn, deadline_at)
+            except asyncio.CancelledError:
+                # Not an outcome: release the half-open probe so the breaker can't wedge
+                self.breaker.abandon()
+                raise
+            except Exception as e:
+                last_error = e
+                self.breaker.record_failure()
+                self.stats["failures"] += 1
+                print(f"❌ {self.name} attempt {attempt + 1}/{self.max_attempts} failed: {type(e).__name__}: {e}")
+                if attempt + 1 >= self.max_attempts or self.breaker.state != CircuitBreaker.CLOSED:
+                    continue
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                # Skip a retry that can't finish (backoff plus a typical call) before the deadline
+                if time.monotonic() + delay + (self.latency.percentile(50) or 0.0) >= deadline_at:
+                    break
+                await asyncio.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            self.stats["successes"] += 1
+            if result is not None:
+                self.cache.set(key, result)
+            return result
+
+        return self._fallback(key, last_error)
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "latency_p50": self.latency.percentile(50),
+            "latency_p95": self.latency.percentile(95),
+            "hedge_delay": self.hedge_delay(),
+            "deadline": self.deadline,
+            **self.stats,
+        }
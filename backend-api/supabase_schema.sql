@@ -24,7 +24,7 @@ CREATE TABLE IF NOT EXISTS public.signals (
   confidence DECIMAL(3, 2),
   timeframe VARCHAR(10),
   limit_orders BOOLEAN DEFAULT FALSE, -- ✅ NEW: Support limit orders
-  status VARCHAR(50) DEFAULT 'pending', -- pending, processing, executed, failed
+  status VARCHAR(50) DEFAULT 'pending', -- pending, processing, executed, failed, rejected, canary (probe only)
   reasoning TEXT,
   created_at TIMESTAMP DEFAULT NOW(),
   executed_at TIMESTAMP,
@@ -78,3 +78,160 @@ CREATE POLICY "Allow public read on users" ON public.users FOR SELECT USING (tru
 CREATE POLICY "Allow public read on signals" ON public.signals FOR SELECT USING (true);
 CREATE POLICY "Allow public read on trades" ON public.trades FOR SELECT USING (true);
 CREATE POLICY "Allow public read on account_state" ON public.account_state FOR SELECT USING (true);
+
+-- Investments ledger: one row per contribution (feeds share-of-pool history)
+CREATE TABLE IF NOT EXISTS public.investments (
+  id BIGSERIAL PRIMARY KEY,
+  user_id VARCHAR(255) NOT NULL REFERENCES public.users(user_id),
+  amount DECIMAL(15, 2) NOT NULL,
+  created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Precomputed per-user performance reports (refreshed by the API in the background)
+CREATE TABLE IF NOT EXISTS public.user_reports (
+  user_id VARCHAR(255) PRIMARY KEY REFERENCES public.users(user_id),
+  report JSONB NOT NULL,
+  computed_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_investments_user_id ON public.investments(user_id);
+
+ALTER TABLE public.investments ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.user_reports ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow public read on user_reports" ON public.user_reports FOR SELECT USING (true);
+
+-- Closing equity per day (last account_state row of each day) for the report window
+CREATE OR REPLACE FUNCTION public.daily_closing_equity(p_since TIMESTAMP)
+RETURNS TABLE ("timestamp" TIMESTAMP, equity DECIMAL) LANGUAGE sql STABLE AS $$
+  SELECT DISTINCT ON (date_trunc('day', a.timestamp)) a.timestamp, a.equity
+  FROM public.account_state a
+  WHERE a.timestamp >= p_since
+  ORDER BY date_trunc('day', a.timestamp), a.timestamp DESC;
+$$;
+
+-- Equity chart: account_state thinned to time buckets, keeping each bucket's
+-- first, last, lowest and highest equity row (so drawdown stays exact).
+-- Returned as one JSON array, so the response isn't cut at the API's max rows.
+CREATE OR REPLACE FUNCTION public.equity_buckets(p_start TIMESTAMP, p_end TIMESTAMP, p_bucket_seconds INTEGER)
+RETURNS JSONB LANGUAGE sql STABLE AS $$
+  WITH binned AS (
+    SELECT a.timestamp, a.balance, a.equity,
+           date_bin(make_interval(secs => p_bucket_seconds), a.timestamp, p_start) AS bucket
+    FROM public.account_state a
+    WHERE a.timestamp >= p_start AND a.timestamp <= p_end
+  ), ranked AS (
+    SELECT b.*,
+           row_number() OVER (PARTITION BY bucket ORDER BY b.timestamp) AS first_rank,
+           row_number() OVER (PARTITION BY bucket ORDER BY b.timestamp DESC) AS last_rank,
+           row_number() OVER (PARTITION BY bucket ORDER BY b.equity, b.timestamp) AS min_rank,
+           row_number() OVER (PARTITION BY bucket ORDER BY b.equity DESC, b.timestamp) AS max_rank
+    FROM binned b
+  )
+  SELECT COALESCE(jsonb_agg(jsonb_build_object('timestamp', r.timestamp, 'balance', r.balance, 'equity', r.equity)
+                            ORDER BY r.timestamp), '[]'::jsonb)
+  FROM ranked r
+  WHERE r.first_rank = 1 OR r.last_rank = 1 OR r.min_rank = 1 OR r.max_rank = 1;
+$$;
+
+-- Signal latency tracing: trace id and per-stage timestamps
+-- (created_at = stored: column default NOW() at insert, UTC on Supabase; executed_at = EA execution time)
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS trace_id VARCHAR(64);
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS generated_at TIMESTAMP;
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS received_at TIMESTAMP;
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS confirmed_at TIMESTAMP;
+ALTER TABLE public.trades ADD COLUMN IF NOT EXISTS trace_id VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_signals_trace_id ON public.signals(trace_id);
+CREATE INDEX IF NOT EXISTS idx_trades_signal_id ON public.trades(signal_id);
+
+-- Hot/cold split: the API's archiver moves rows older than the retention
+-- window into zstd NDJSON files and records each file here. Hot tables
+-- keep only recent rows. (Declarative partitioning is not used because
+-- partitioned tables can't keep trades.ticket UNIQUE, which the bulk
+-- upserts rely on.)
+CREATE TABLE IF NOT EXISTS public.archive_index (
+  id BIGSERIAL PRIMARY KEY,
+  table_name VARCHAR(50) NOT NULL,
+  min_id BIGINT NOT NULL,
+  max_id BIGINT NOT NULL,
+  range_start TIMESTAMP NOT NULL,
+  range_end TIMESTAMP NOT NULL,
+  row_count INTEGER NOT NULL,
+  bytes BIGINT,
+  location TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_archive_index_time ON public.archive_index(table_name, range_start, range_end);
+CREATE INDEX IF NOT EXISTS idx_archive_index_ids ON public.archive_index(table_name, min_id, max_id);
+
+-- Archived signals may still be referenced by trades; resolve them via archive_index
+ALTER TABLE public.trades DROP CONSTRAINT IF EXISTS trades_signal_id_fkey;
+
+-- Support the archiver's (status, time) scans
+CREATE INDEX IF NOT EXISTS idx_signals_status_created_at ON public.signals(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_trades_status_closed_at ON public.trades(status, closed_at);
+
+ALTER TABLE public.archive_index ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow public read on archive_index" ON public.archive_index FOR SELECT USING (true);
+
+-- Signal acknowledgement: the EA acks claimed signals in batches; claims
+-- not acked within the lease are released back to pending by the API
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS ticket BIGINT;
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS error TEXT;
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS acked_at TIMESTAMP;
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS delivery_attempts INTEGER DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_signals_status_claimed_at ON public.signals(status, claimed_at);
+
+-- One UPDATE for a whole ack batch: p_acks = [{signal_id, status, ticket, error, executed_at}, ...]
+-- Late acks for signals already released to pending are still accepted.
+-- An executed ack is still applied after the lease sweep failed the signal:
+-- the trade exists, so the late ack wins over 'lease expired without ack'
+DROP FUNCTION IF EXISTS public.ack_signals(JSONB, TIMESTAMP);
+CREATE OR REPLACE FUNCTION public.ack_signals(p_acks JSONB, p_now TIMESTAMP)
+RETURNS TABLE (id BIGINT, status VARCHAR, symbol VARCHAR, action VARCHAR, volume DECIMAL) LANGUAGE sql AS $$
+  UPDATE public.signals s
+  SET status = a.status,
+      ticket = COALESCE(a.ticket, s.ticket),
+      error = a.error,
+      executed_at = CASE WHEN a.status = 'executed' THEN COALESCE(a.executed_at, p_now) ELSE s.executed_at END,
+      confirmed_at = CASE WHEN a.status = 'executed' THEN COALESCE(s.confirmed_at, p_now) ELSE s.confirmed_at END,
+      acked_at = p_now,
+      updated_at = p_now
+  FROM jsonb_to_recordset(p_acks) AS a(signal_id BIGINT, status VARCHAR, ticket BIGINT, error TEXT, executed_at TIMESTAMP)
+  WHERE s.id = a.signal_id
+    AND (s.status IN ('processing', 'pending')
+         OR (a.status = 'executed' AND s.status = 'failed' AND s.error = 'lease expired without ack'))
+  RETURNING s.id, s.status, s.symbol, s.action, s.volume;
+$$;
+
+-- Lease sweep: expired claims go back to pending, or to failed after p_max_deliveries
+CREATE OR REPLACE FUNCTION public.release_signal_leases(p_cutoff TIMESTAMP, p_max_deliveries INTEGER)
+RETURNS TABLE (id BIGINT, status VARCHAR) LANGUAGE sql AS $$
+  UPDATE public.signals s
+  SET delivery_attempts = COALESCE(s.delivery_attempts, 0) + 1,
+      status = CASE WHEN COALESCE(s.delivery_attempts, 0) + 1 >= p_max_deliveries THEN 'failed' ELSE 'pending' END,
+      error = CASE WHEN COALESCE(s.delivery_attempts, 0) + 1 >= p_max_deliveries THEN 'lease expired without ack' ELSE s.error END,
+      claimed_at = NULL
+  WHERE s.status = 'processing' AND s.claimed_at < p_cutoff
+  RETURNING s.id, s.status;
+$$;
+
+-- Pre-trade risk check: original volume of signals scaled down by the exposure caps
+ALTER TABLE public.signals ADD COLUMN IF NOT EXISTS requested_volume DECIMAL(10, 2);
+
+-- Symbol specs pushed by the EA (normalization/validation of incoming signals)
+CREATE TABLE IF NOT EXISTS public.symbol_specs (
+  symbol VARCHAR(50) PRIMARY KEY,
+  digits INTEGER NOT NULL,
+  point DECIMAL(20, 10) NOT NULL,
+  tick_size DECIMAL(20, 10) NOT NULL,
+  volume_min DECIMAL(20, 8) NOT NULL,
+  volume_max DECIMAL(20, 8) NOT NULL,
+  volume_step DECIMAL(20, 8) NOT NULL,
+  stops_level INTEGER DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE public.symbol_specs ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow public read on symbol_specs" ON public.symbol_specs FOR SELECT USING (true);
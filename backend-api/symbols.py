@@ -0,0 +1,109 @@
+"""
+Symbol specifications pushed by the EA, used to normalize and validate
+signals at ingestion
+
+One row per symbol, stored column-wise in NumPy arrays: digits, point,
+tick size, min/max/step volume and stop level (in points). The EA pushes
+the Market Watch specs on start and periodically after that. They are
+also persisted, so a restart starts with a warm table.
+
+normalize() snaps prices to the tick size and volume to the volume step.
+It also applies the checks the EA would otherwise only apply after a poll:
+SL/TP present and on the correct side, and the minimum stop distance
+when an entry price is given. Symbols without a spec pass through
+unchanged unless a spec is required.
+"""
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SPEC_FIELDS = ("digits", "point", "tick_size", "volume_min", "volume_max", "volume_step", "stops_level")
+
+
+class SymbolTable:
+    def __init__(self, capacity: int = 64):
+        self.symbols: Dict[str, int] = {}
+        self.columns = {field: np.zeros(capacity) for field in SPEC_FIELDS}
+        self.updated_at: List[Optional[str]] = [None] * capacity
+
+    def _slot(self, symbol: str) -> int:
+        slot = self.symbols.get(symbol)
+        if slot is None:
+            slot = len(self.symbols)
+            if slot == len(self.updated_at):
+                self.columns = {f: np.concatenate([c, np.zeros(slot)]) for f, c in self.columns.items()}
+                self.updated_at.extend([None] * slot)
+            self.symbols[symbol] = slot
+        return slot
+
+    def update(self, specs: List[dict], updated_at: str) -> int:
+        for spec in specs:
+            slot = self._slot(spec["symbol"])
+            for field in SPEC_FIELDS:
+                self.columns[field][slot] = spec[field]
+            self.updated_at[slot] = spec.get("updated_at") or updated_at
+        return len(specs)
+
+    def get(self, symbol: str) -> Optional[dict]:
+        slot = self.symbols.get(symbol)
+        if slot is None:
+            return None
+        spec = {field: float(self.columns[field][slot]) for field in SPEC_FIELDS}
+        spec["digits"] = int(spec["digits"])
+        return {"symbol": symbol, **spec, "updated_at": self.updated_at[slot]}
+
+    def round_volume(self, symbol: str, volume: float) -> float:
+        """Round down to the volume step, cap at the maximum; 0 if below the minimum"""
+        slot = self.symbols.get(symbol)
+        if slot is None:
+            return volume
+        step = self.columns["volume_step"][slot] or 0.01
+        volume = min(volume, self.columns["volume_max"][slot] or volume)
+        volume = math.floor(volume / step + 1e-9) * step
+        decimals = max(0, -int(math.floor(math.log10(step))))
+        volume = round(float(volume), decimals)
+        return volume if volume >= self.columns["volume_min"][slot] else 0.0
+
+    def _round_price(self, slot: int, price: float) -> float:
+        tick = self.columns["tick_size"][slot] or self.columns["point"][slot]
+        if tick > 0:
+            price = round(price / tick) * tick
+        return round(float(price), int(self.columns["digits"][slot]))
+
+    def normalize(self, signal: dict, require_spec: bool = False) -> Optional[str]:
+        """Normalize a signal row in place; returns a rejection reason or None"""
+        action = signal["action"].upper()
+        if action not in ("BUY", "SELL"):
+            return f"unknown action {signal['action']}"
+
+        slot = self.symbols.get(signal["symbol"])
+        if slot is None:
+            return f"no symbol specification for {signal['symbol']}" if require_spec else None
+
+        volume = self.round_volume(signal["symbol"], signal["volume"])
+        if volume <= 0:
+            return f"volume {signal['volume']:g} below minimum {self.columns['volume_min'][slot]:g}"
+        signal["volume"] = volume
+        for field in ("entry", "sl", "tp"):
+            if signal.get(field):
+                signal[field] = self._round_price(slot, signal[field])
+
+        sl, tp, entry = signal.get("sl"), signal.get("tp"), signal.get("entry")
+        if not sl or not tp or sl <= 0 or tp <= 0:
+            return "SL and TP are required"
+        if action == "BUY" and tp <= sl:
+            return "BUY: TP must be above SL"
+        if action == "SELL" and tp >= sl:
+            return "SELL: TP must be below SL"
+
+        if entry:
+            if not min(sl, tp) < entry < max(sl, tp):
+                return "entry must lie between SL and TP"
+            min_distance = self.columns["stops_level"][slot] * self.columns["point"][slot]
+            if min(abs(entry - sl), abs(tp - entry)) < min_distance - 1e-12:
+                return f"SL/TP closer than the stop level ({min_distance:g}) to entry"
+        return None
+
+    def status(self) -> List[dict]:
+        return [self.get(symbol) for symbol in self.symbols]
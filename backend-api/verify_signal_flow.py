@@ -1,189 +1,223 @@
 #!/usr/bin/env python3
 """
-✅ COMPREHENSIVE SIGNAL FLOW VERIFICATION
-Tests the complete signal chain from Anso-vision to Ansorade to Supabase to MT5
+✅ SIGNAL FLOW PROBE
+Checks the signal chain from Anso-vision to Ansorade to Supabase to MT5.
+
+Independent checks run concurrently. The canary check posts a synthetic
+signal (status "canary", so the EA never executes it) and times how long
+it takes to show up at /api/signals/pending?canary=true.
+
+Usage:
+    python verify_signal_flow.py                    # one round against production
+    python verify_signal_flow.py --local            # API on localhost:8000, no generator
+    python verify_signal_flow.py --monitor --interval 30
+    python verify_signal_flow.py --api-url http://127.0.0.1:9000 --generator-url http://127.0.0.1:9001
 """
-import requests
-import json
+import argparse
+import asyncio
 import os
+import time
+import uuid
+from collections import defaultdict, deque
 from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configuration
-ANSO_VISION_URL = "https://anso-vision-backend.onrender.com"
-ANSORADE_URL = "https://ansorade-backend.onrender.com"
-API_KEY = "Mr.creative090"
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
-print("\n" + "="*80)
-print("🔄 SIGNAL FLOW VERIFICATION")
-print("="*80)
-
-# Test 1: Check Anso-vision backend health
-print("\n1️⃣ CHECKING ANSO-VISION BACKEND...")
-try:
-    response = requests.get(f"{ANSO_VISION_URL}/health", timeout=5)
-    if response.status_code == 200:
-        health = response.json()
-        print(f"   ✅ Anso-vision is healthy")
-        print(f"      Service: {health.get('service')}")
-        print(f"      Version: {health.get('version')}")
-        print(f"      WebSocket connections: {health.get('websocket_connections')}")
-        print(f"      MT5 Backend: {health.get('mt5_backend')}")
-    else:
-        print(f"   ⚠️ Anso-vision returned: {response.status_code}")
-except Exception as e:
-    print(f"   ❌ Cannot reach Anso-vision: {e}")
-
-# Test 2: Check Ansorade backend health
-print("\n2️⃣ CHECKING ANSORADE BACKEND...")
-try:
-    response = requests.get(f"{ANSORADE_URL}/health", timeout=5)
-    if response.status_code == 200:
-        health = response.json()
-        print(f"   ✅ Ansorade is healthy")
-        print(f"      Status: {health.get('status')}")
-        print(f"      Database: {health.get('database')}")
-        print(f"      API Key: {'Configured' if health.get('api_key') else 'Missing'}")
-    else:
-        print(f"   ⚠️ Ansorade returned: {response.status_code}")
-except Exception as e:
-    print(f"   ❌ Cannot reach Ansorade: {e}")
-
-# Test 3: Send a test signal from Anso-vision format
-print("\n3️⃣ TESTING SIGNAL POST TO ANSORADE...")
-test_signal = {
-    "symbol": "EURUSD",
-    "action": "BUY",
-    "entry": 1.0950,
-    "tp": 1.1050,
-    "sl": 1.0900,
-    "volume": 0.01,
-    "confidence": 0.85,
-    "limit_orders": False,
-    "reasoning": "Test signal - Verify signal flow",
-    "timeframe": "1h"
-}
-
-try:
-    headers = {
-        "X-API-Key": API_KEY,
-        "Content-Type": "application/json"
-    }
-    response = requests.post(
-        f"{ANSORADE_URL}/api/signal",
-        json=test_signal,
-        headers=headers,
-        timeout=5
-    )
-    
-    if response.status_code == 200:
-        result = response.json()
-        signal_id = result.get('signal_id')
-        print(f"   ✅ Signal accepted by Ansorade")
-        print(f"      Signal ID: {signal_id}")
-        print(f"      Status: {result.get('status')}")
-        print(f"      Symbol: {result.get('symbol')}")
-        print(f"      Action: {result.get('action')}")
-        print(f"      Limit Orders: {result.get('limit_orders')}")
-    elif response.status_code == 403:
-        print(f"   ❌ API Key rejected: {response.text}")
-    else:
-        print(f"   ❌ Ansorade error ({response.status_code}): {response.text[:100]}")
-except Exception as e:
-    print(f"   ❌ Cannot POST signal: {e}")
-
-# Test 4: Check if signal was stored in Supabase
-print("\n4️⃣ CHECKING SUPABASE SIGNAL STORAGE...")
-try:
-    from supabase import create_client
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    
-    # Get the most recent signal
-    response = supabase.table("signals").select("*").order("created_at", desc=True).limit(1).execute()
-    
-    if response.data:
-        signal = response.data[0]
-        print(f"   ✅ Latest signal found in Supabase")
-        print(f"      ID: {signal.get('id')}")
-        print(f"      Symbol: {signal.get('symbol')}")
-        print(f"      Action: {signal.get('action')}")
-        print(f"      Entry: {signal.get('entry')}")
-        print(f"      TP: {signal.get('tp')}")
-        print(f"      SL: {signal.get('sl')}")
-        print(f"      Limit Orders: {signal.get('limit_orders')}")
-        print(f"      Reasoning: {signal.get('reasoning')[:50] if signal.get('reasoning') else 'N/A'}...")
-        print(f"      Status: {signal.get('status')}")
-        print(f"      Created: {signal.get('created_at')}")
-    else:
-        print(f"   ⚠️ No signals found in Supabase")
-except Exception as e:
-    print(f"   ❌ Cannot access Supabase: {e}")
-
-# Test 5: Check pending signals (for MT5 EA)
-print("\n5️⃣ CHECKING PENDING SIGNALS FOR MT5 EA...")
-try:
-    headers = {"X-API-Key": API_KEY}
-    response = requests.get(
-        f"{ANSORADE_URL}/api/signals/pending",
-        headers=headers,
-        timeout=5
-    )
-    
-    if response.status_code == 200:
-        pending_signals = response.json()
-        print(f"   ✅ Fetched pending signals")
-        print(f"      Count: {len(pending_signals)}")
-        if pending_signals:
-            for signal in pending_signals[:3]:  # Show first 3
-                print(f"      - {signal.get('symbol')} {signal.get('action')} (ID: {signal.get('id')})")
-    else:
-        print(f"   ⚠️ Cannot fetch pending signals: {response.status_code}")
-except Exception as e:
-    print(f"   ❌ Cannot fetch pending signals: {e}")
-
-# Test 6: Test manual signal endpoint
-print("\n6️⃣ TESTING MANUAL SIGNAL ENDPOINT...")
-manual_signal = {
-    "symbol": "GBPUSD",
-    "action": "SELL",
-    "entry": 1.2750,
-    "tp": 1.2650,
-    "sl": 1.2850,
-    "volume": 0.02,
-    "confidence": 0.75,
-    "timeframe": "4h",
-    "reasoning": "Manual test signal"
-}
-
-try:
-    response = requests.post(
-        f"{ANSORADE_URL}/api/signals/manual",
-        json=manual_signal,
-        timeout=5
-    )
-    
-    if response.status_code == 200:
-        result = response.json()
-        print(f"   ✅ Manual signal created")
-        print(f"      Signal ID: {result.get('signal_id')}")
-        print(f"      Status: {result.get('message')}")
-    else:
-        print(f"   ❌ Manual signal failed: {response.text[:100]}")
-except Exception as e:
-    print(f"   ❌ Cannot create manual signal: {e}")
-
-# Summary
-print("\n" + "="*80)
-print("✅ SIGNAL FLOW VERIFICATION COMPLETE")
-print("="*80)
-print(f"\nTimestamp: {datetime.now().isoformat()}")
-print("\n📋 Next Steps:")
-print("  1. If all tests pass: Signal flow is working correctly")
-print("  2. Check Ansorade logs to verify signal reception")
-print("  3. Verify MT5 EA is polling /api/signals/pending")
-print("  4. Monitor signal execution in Supabase trades table")
-print()
+ANSO_VISION_URL = os.getenv("ANSO_VISION_URL", "https://anso-vision-backend.onrender.com")
+ANSORADE_URL = os.getenv("ANSORADE_URL", "https://ansorade-backend.onrender.com")
+API_KEY = os.getenv("API_SECRET_KEY", "Mr.creative090")
+
+
+class CheckResult:
+    def __init__(self, name: str, ok: bool, latency_ms: float, detail: str = "", hops: Optional[Dict[str, float]] = None):
+        self.name = name
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.detail = detail
+        self.hops = hops or {}
+
+
+class Probe:
+    def __init__(self, api_url: str, generator_url: Optional[str], api_key: str, timeout: float = 10.0,
+                 canary_timeout: float = 15.0, poll_interval: float = 0.25):
+        self.api_url = api_url.rstrip("/")
+        self.generator_url = generator_url.rstrip("/") if generator_url else None
+        self.api_key = api_key
+        self.timeout = timeout
+        self.canary_timeout = canary_timeout
+        self.poll_interval = poll_interval
+
+    async def _timed_get(self, client: httpx.AsyncClient, name: str, url: str, **kwargs) -> CheckResult:
+        start = time.perf_counter()
+        try:
+            response = await client.get(url, **kwargs)
+            elapsed = (time.perf_counter() - start) * 1000
+            return CheckResult(name, response.status_code == 200, elapsed, f"HTTP {response.status_code}")
+        except Exception as e:
+            return CheckResult(name, False, (time.perf_counter() - start) * 1000, f"{type(e).__name__}: {e}")
+
+    async def check_generator(self, client: httpx.AsyncClient) -> CheckResult:
+        return await self._timed_get(client, "generator_health", f"{self.generator_url}/health")
+
+    async def check_api(self, client: httpx.AsyncClient) -> CheckResult:
+        return await self._timed_get(client, "api_health", f"{self.api_url}/health")
+
+    async def check_supabase(self) -> CheckResult:
+        """Latest stored signal, read directly from Supabase"""
+        start = time.perf_counter()
+        try:
+            def latest():
+                from supabase import create_client
+                supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+                return supabase.table("signals").select("id, created_at").order("created_at", desc=True).limit(1).execute()
+
+            response = await asyncio.to_thread(latest)
+            elapsed = (time.perf_counter() - start) * 1000
+            detail = f"latest signal {response.data[0]['id']}" if response.data else "no signals"
+            return CheckResult("supabase", True, elapsed, detail)
+        except Exception as e:
+            return CheckResult("supabase", False, (time.perf_counter() - start) * 1000, f"{type(e).__name__}: {e}")
+
+    async def check_canary(self, client: httpx.AsyncClient) -> CheckResult:
+        """POST a canary signal and time its arrival at /api/signals/pending"""
+        trace_id = f"canary-{uuid.uuid4().hex[:12]}"
+        headers = {"X-API-Key": self.api_key}
+        canary = {
+            "symbol": "EURUSD",
+            "action": "BUY",
+            "volume": 0.01,
+            "entry": 1.0950,
+            "tp": 1.1050,
+            "sl": 1.0900,
+            "timeframe": "1h",
+            "reasoning": "Synthetic monitor canary",
+            "trace_id": trace_id,
+            "generated_at": datetime.utcnow().isoformat(),
+            "canary": True,
+        }
+
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{self.api_url}/api/signal", json=canary, headers=headers)
+            posted = time.perf_counter()
+            if response.status_code != 200:
+                return CheckResult("canary", False, (posted - start) * 1000, f"POST HTTP {response.status_code}")
+
+            deadline = posted + self.canary_timeout
+            while time.perf_counter() < deadline:
+                poll = await client.get(f"{self.api_url}/api/signals/pending", params={"canary": "true"}, headers=headers)
+                if poll.status_code == 200 and any(s.get("trace_id") == trace_id for s in poll.json()):
+                    arrived = time.perf_counter()
+                    return CheckResult("canary", True, (arrived - start) * 1000, trace_id, hops={
+                        "post_ms": (posted - start) * 1000,
+                        "post_to_pending_ms": (arrived - posted) * 1000,
+                    })
+                await asyncio.sleep(self.poll_interval)
+            return CheckResult("canary", False, (time.perf_counter() - start) * 1000, f"{trace_id} not seen in {self.canary_timeout}s")
+        except Exception as e:
+            return CheckResult("canary", False, (time.perf_counter() - start) * 1000, f"{type(e).__name__}: {e}")
+
+    async def run_once(self, with_supabase: bool = True) -> List[CheckResult]:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            checks = [self.check_api(client), self.check_canary(client)]
+            if self.generator_url:
+                checks.append(self.check_generator(client))
+            if with_supabase and os.getenv("SUPABASE_URL"):
+                checks.append(self.check_supabase())
+            return list(await asyncio.gather(*checks))
+
+
+class LatencyHistory:
+    """Rolling per-check / per-hop latency samples for the monitor"""
+
+    def __init__(self, window: int = 500):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.failures = defaultdict(int)
+
+    def add(self, results: List[CheckResult]):
+        for r in results:
+            if not r.ok:
+                self.failures[r.name] += 1
+                continue
+            self.samples[r.name].append(r.latency_ms)
+            for hop, ms in r.hops.items():
+                self.samples[f"{r.name}.{hop}"].append(ms)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            pick = lambda p: ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+            out[name] = {"n": len(ordered), "p50": pick(50), "p90": pick(90), "p99": pick(99)}
+        return out
+
+
+def print_round(results: List[CheckResult]):
+    print(f"\n🔄 {datetime.now().isoformat(timespec='seconds')}")
+    for r in sorted(results, key=lambda r: r.name):
+        icon = "✅" if r.ok else "❌"
+        hops = "  " + " ".join(f"{k}={v:.0f}ms" for k, v in r.hops.items()) if r.hops else ""
+        print(f"   {icon} {r.name:<18} {r.latency_ms:>8.0f}ms  {r.detail}{hops}")
+
+
+def print_percentiles(history: LatencyHistory):
+    print("\n📊 Latency percentiles (ms)")
+    for name, p in sorted(history.percentiles().items()):
+        print(f"   {name:<34} n={p['n']:<5} p50={p['p50']:>7.0f} p90={p['p90']:>7.0f} p99={p['p99']:>7.0f}"
+              f"  failures={history.failures.get(name, 0)}")
+
+
+async def monitor(probe: Probe, interval: float, summary_every: int, with_supabase: bool):
+    history = LatencyHistory()
+    rounds = 0
+    while True:
+        started = time.perf_counter()
+        results = await probe.run_once(with_supabase)
+        history.add(results)
+        print_round(results)
+        rounds += 1
+        if rounds % summary_every == 0:
+            print_percentiles(history)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent signal pipeline probe / synthetic monitor")
+    parser.add_argument("--api-url", default=ANSORADE_URL)
+    parser.add_argument("--generator-url", default=ANSO_VISION_URL)
+    parser.add_argument("--api-key", default=API_KEY)
+    parser.add_argument("--local", action="store_true", help="Target an API on localhost:8000 and skip the generator")
+    parser.add_argument("--no-generator", action="store_true", help="Skip the generator health check")
+    parser.add_argument("--no-supabase", action="store_true", help="Skip the direct Supabase check")
+    parser.add_argument("--monitor", action="store_true", help="Run continuously")
+    parser.add_argument("--interval", type=float, default=30.0, help="Seconds between monitor rounds")
+    parser.add_argument("--summary-every", type=int, default=10, help="Print percentiles every N rounds")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--canary-timeout", type=float, default=15.0)
+    args = parser.parse_args()
+
+    api_url = "http://localhost:8000" if args.local else args.api_url
+    generator_url = None if (args.local or args.no_generator) else args.generator_url
+    probe = Probe(api_url, generator_url, args.api_key, args.timeout, args.canary_timeout)
+
+    print("=" * 80)
+    print(f"🔄 SIGNAL FLOW PROBE → {api_url}" + (f" (generator {generator_url})" if generator_url else ""))
+    print("=" * 80)
+
+    try:
+        if args.monitor:
+            asyncio.run(monitor(probe, args.interval, args.summary_every, not args.no_supabase))
+        else:
+            results = asyncio.run(probe.run_once(not args.no_supabase))
+            print_round(results)
+            raise SystemExit(0 if all(r.ok for r in results) else 1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Wire formats for the high-volume endpoints.
+
+- Every response is serialized with orjson (ORJSONResponse is the app default)
+- Responses are gzip-compressed when the client sends Accept-Encoding: gzip
+- Clients may send and receive msgpack bodies (Content-Type / Accept:
+  application/x-msgpack) instead of JSON
+- The MT5 EA can fetch pending signals in a compact line format
+  (one signal per line, fixed field order, "|"-separated) that it parses
+  in a single pass
+"""
+from typing import Any, Callable, List, Optional
+
+import msgpack
+import orjson
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from fastapi.routing import APIRoute
+
+MSGPACK_MEDIA_TYPES = ("application/x-msgpack", "application/msgpack", "application/vnd.msgpack")
+
+
+def is_msgpack(media_type: Optional[str]) -> bool:
+    """True if a Content-Type / Accept value names msgpack"""
+    if not media_type:
+        return False
+    return any(mt in media_type for mt in MSGPACK_MEDIA_TYPES)
+
+
+def _default(obj: Any):
+    """msgpack fallback for types it does not know (datetime, Decimal, ...)"""
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return float(obj)
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def negotiate(request: Request, content: Any, **kwargs) -> Response:
+    """Return msgpack if the client asked for it, orjson otherwise"""
+    if is_msgpack(request.headers.get("accept")):
+        return MsgPackResponse(content, **kwargs)
+    return ORJSONResponse(content, **kwargs)
+
+
+async def _msgpack_as_json(request: Request) -> Request:
+    """Re-present a msgpack request body to FastAPI as JSON so models validate as usual"""
+    try:
+        payload = msgpack.unpackb(await request.body(), raw=False)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid msgpack body: {str(e)}")
+
+    scope = dict(request.scope)
+    scope["headers"] = [(k, v) for k, v in request.scope["headers"] if k != b"content-type"]
+    scope["headers"].append((b"content-type", b"application/json"))
+
+    transcoded = Request(scope, request.receive)
+    transcoded._body = orjson.dumps(payload)
+    return transcoded
+
+
+class WireRoute(APIRoute):
+    """APIRoute that accepts msgpack request bodies on every endpoint"""
+
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            if is_msgpack(request.headers.get("content-type")):
+                request = await _msgpack_as_json(request)
+            return await original_handler(request)
+
+        return handler
+
+
+def encode_json(payload: Any) -> bytes:
+    """Serialize an outbound request body with orjson"""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+# Compact signal format: first line is "<version>|<count>", then one signal
+# per line with fields in exactly this order. Empty field = null.
+# Keep in sync with ProcessCompactSignals() in CommunityTrader.mq5
+COMPACT_VERSION = "CS2"
+COMPACT_SIGNAL_FIELDS = ("id", "symbol", "action", "volume", "entry", "sl", "tp", "confidence", "timeframe", "limit_orders", "trace_id")
+
+
+def _compact_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value)
+    # Delimiters can't appear inside a field
+    return str(value).replace("|", "").replace("\n", "").replace("\r", "")
+
+
+def encode_compact_signals(signals: List[dict]) -> str:
+    """Render signal rows in the compact line format"""
+    lines = [f"{COMPACT_VERSION}|{len(signals)}"]
+    for signal in signals:
+        lines.append("|".join(_compact_value(signal.get(field)) for field in COMPACT_SIGNAL_FIELDS))
+    return "\n".join(lines) + "\n"
+
+
+def compact_response(signals: List[dict]) -> PlainTextResponse:
+    return PlainTextResponse(encode_compact_signals(signals))